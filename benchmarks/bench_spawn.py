@@ -0,0 +1,72 @@
+"""
+per-spawn latency of ExtTask, with the default asyncio path and with the spawners
+
+Usage:
+
+    python benchmarks/bench_spawn.py [--count 500] [--concurrency 1] [--ballast-mb 0]
+
+The ballast inflates the parent process, to show how the spawn cost grows with the size of the parent.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from konstructcore.tasks.ext_task import ExtTask
+from konstructcore.tasks.spawn import PosixSpawner, ForkServer
+
+
+async def _measure(spawner, count: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def _one():
+        async with semaphore:
+            task = ExtTask(name='true', command=['true'], collect_output=False, spawner=spawner)
+            start = time.perf_counter()
+            result = await task.run()
+            latencies.append(time.perf_counter() - start)
+            assert result.is_ok(), result
+
+    await asyncio.gather(*[_one() for _ in range(count)])
+    return latencies
+
+
+def _report(label: str, latencies: list[float], elapsed: float):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f'{label:<24} mean {statistics.mean(latencies) * 1e3:7.3f} ms   p50 {p50 * 1e3:7.3f} ms   '
+          f'p99 {p99 * 1e3:7.3f} ms   {len(latencies) / elapsed:8.1f} spawns/s')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--ballast-mb', type=int, default=0)
+    args = parser.parse_args()
+
+    # the fork server is started before the ballast, as it would be in a real application
+    fork_server = ForkServer()
+    await fork_server.start()
+    ballast = bytearray(args.ballast_mb * 1024 * 1024)
+    for i in range(0, len(ballast), 4096):
+        ballast[i] = 1
+
+    posix_spawner = PosixSpawner()
+    for label, spawner in (('asyncio (default)', None), ('PosixSpawner', posix_spawner), ('ForkServer', fork_server)):
+        start = time.perf_counter()
+        latencies = await _measure(spawner, args.count, args.concurrency)
+        _report(label, latencies, time.perf_counter() - start)
+
+    posix_spawner.close()
+    await fork_server.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,10 +1,14 @@
 """
 Result[T] is a datatype that represents the result of a computation that may fail.
+
+A Result is compact: it has no per-instance __dict__, and Result.ok(None) is a shared instance. Results must be
+treated as immutable.
 """
 
-from typing import Generic, TypeVar, Optional
+from typing import Generic, TypeVar, Optional, Callable, Iterable
 
 T = TypeVar("T")
+U = TypeVar("U")
 
 
 class Result(Generic[T]):
@@ -12,6 +16,8 @@ class Result(Generic[T]):
     A datatype that represents the result of a computation that may fail.
     """
 
+    __slots__ = ('value', 'error')
+
     def __init__(self, value: Optional[T] = None, error: Optional[Exception] = None):
         self.value = value
         self.error = error
@@ -31,8 +37,10 @@ class Result(Generic[T]):
     @classmethod
     def ok(cls, value: T) -> 'Result[Generic[T]]':
         """
-        to directly construct an Ok value
+        to directly construct an Ok value, Ok(None) is a shared instance
         """
+        if value is None and cls is Result:
+            return _OK_NONE
         return cls(value, error=None)
 
     @classmethod
@@ -42,6 +50,44 @@ class Result(Generic[T]):
         """
         return cls(value=None, error=error)
 
+    def map(self, f: Callable[[T], U]) -> 'Result[U]':
+        """
+        apply f to the value of an Ok, an Err is returned as is
+        """
+        return Result.ok(f(self.value)) if self.error is None else self
+
+    def and_then(self, f: Callable[[T], 'Result[U]']) -> 'Result[U]':
+        """
+        chain a computation which may fail on the value of an Ok, an Err is returned as is
+        """
+        return f(self.value) if self.error is None else self
+
+    def unwrap_or(self, default: T) -> T:
+        """
+        the value of an Ok, or the default for an Err
+        """
+        return self.value if self.error is None else default
+
+    def unwrap(self) -> T:
+        """
+        the value of an Ok, or raise the error of an Err
+        """
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    @staticmethod
+    def collect(results: Iterable['Result[T]']) -> 'Result[list[T]]':
+        """
+        to turn results into Ok(list of values), or the first Err
+        """
+        values = []
+        for result in results:
+            if result.error is not None:
+                return result
+            values.append(result.value)
+        return Result(values)
+
     def __str__(self):
         if self.is_ok():
             return f'Ok({self.value})'
@@ -49,4 +95,7 @@ class Result(Generic[T]):
             return f'Err({self.error})'
 
     def __bool__(self):
-        return self.is_ok()
+        return self.error is None
+
+
+_OK_NONE = Result()
@@ -0,0 +1,97 @@
+"""
+A high-dynamic-range (HDR) histogram of latencies, to report percentiles such as p50/p95/p99.
+
+Unlike the fixed buckets of registry.Histogram, the buckets are log-linear: each power of two is split into 128
+linear sub-buckets. Any value from one tick (a microsecond by default) to hours is recorded with a relative error
+below 1%, in constant time and with memory proportional to the number of distinct buckets hit.
+
+Example:
+
+    histogram = HdrHistogram()
+    histogram.record(0.0123)
+    histogram.percentile(99)
+"""
+import math
+from typing import Optional
+
+_SUB_BUCKET_BITS = 7
+_SUB_BUCKETS = 1 << _SUB_BUCKET_BITS
+
+
+def _index(ticks: int) -> int:
+    if ticks < _SUB_BUCKETS:
+        return ticks
+    shift = ticks.bit_length() - _SUB_BUCKET_BITS - 1
+    return (shift + 1) * _SUB_BUCKETS + (ticks >> shift) - _SUB_BUCKETS
+
+
+def _highest_equivalent(index: int) -> int:
+    """
+    The highest tick count recorded in the bucket at the given index.
+    """
+    if index < _SUB_BUCKETS:
+        return index
+    shift = index // _SUB_BUCKETS - 1
+    mantissa = index % _SUB_BUCKETS + _SUB_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+
+class HdrHistogram:
+    """
+    Record values in seconds, with a resolution of {unit} seconds.
+    """
+
+    def __init__(self, unit: float = 1e-6):
+        self.unit = unit
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, value: float):
+        value = max(0.0, value)
+        index = _index(int(value / self.unit))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: 'HdrHistogram'):
+        if other.unit != self.unit:
+            raise ValueError('can not merge histograms of different units')
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """
+        Return the value below which {p} percent of the recorded values fall, 0.0 if nothing is recorded.
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * min(max(p, 0.0), 100.0) / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.max, max(self.min, (_highest_equivalent(index) + 1) * self.unit))
+        return self.max
+
+    def format(self) -> str:
+        """
+        Return a one-line summary, with the values in milliseconds
+        """
+        if not self.count:
+            return 'no samples'
+        return (f'n={self.count} min={self.min * 1e3:.3f}ms mean={self.mean() * 1e3:.3f}ms '
+                f'p50={self.percentile(50) * 1e3:.3f}ms p95={self.percentile(95) * 1e3:.3f}ms '
+                f'p99={self.percentile(99) * 1e3:.3f}ms max={self.max * 1e3:.3f}ms')
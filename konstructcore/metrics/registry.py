@@ -0,0 +1,256 @@
+"""
+A lightweight, dependency-free metrics registry, exported in the Prometheus text format.
+
+There are three kinds of metrics:
+
+- Counter: a value which only goes up (tasks started, retries, ...)
+- Gauge: a value which goes up and down (tasks in flight, ...)
+- Histogram: the distribution of observed values in fixed buckets (durations, sizes, ...)
+
+A metric may have labels. Each combination of label values is a child metric, created on first use and cached:
+
+    started = DEFAULT_REGISTRY.counter('konstruct_tasks_started_total', 'Tasks started', ['task_type'])
+    started.labels('ExtTask').inc()
+
+Recording is a dict lookup and a few additions on plain attributes, there is no lock. It is meant to be done from the
+event loop thread; concurrent recording from several threads may lose a few increments.
+
+The registry is exported with to_prometheus_text(), write_textfile() (for the node_exporter textfile collector) or
+serve_http() (a local /metrics endpoint).
+"""
+import asyncio
+import bisect
+import math
+import os
+from typing import Optional, Iterable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return f'{{{pairs}}}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        # one more slot for the +Inf bucket
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind = ''
+    child_type = None
+
+    def __init__(self, name: str, help_: str, label_names: Optional[list[str]] = None):
+        self.name = name
+        self.help = help_
+        self.label_names = tuple(label_names or ())
+        self._children: dict[tuple, object] = {}
+        if not self.label_names:
+            self._unlabeled = self._children[()] = self._new_child()
+
+    def _new_child(self):
+        return self.child_type()
+
+    def labels(self, *values: str):
+        """
+        Return the child metric for the given label values, in the order of the label names.
+        """
+        try:
+            return self._children[values]
+        except KeyError:
+            if len(values) != len(self.label_names):
+                raise ValueError(f'{self.name} expects the labels {self.label_names}, got {values}')
+            child = self._children[values] = self._new_child()
+            return child
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError()
+
+    def expose(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    child_type = _CounterChild
+
+    def inc(self, amount: float = 1.0):
+        self._unlabeled.inc(amount)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            yield f'{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}'
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    child_type = _GaugeChild
+
+    def inc(self, amount: float = 1.0):
+        self._unlabeled.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._unlabeled.dec(amount)
+
+    def set(self, value: float):
+        self._unlabeled.set(value)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            yield f'{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}'
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_: str, label_names: Optional[list[str]] = None,
+                 buckets: tuple = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(b for b in buckets if not math.isinf(b)))
+        super().__init__(name, help_, label_names)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self._unlabeled.observe(value)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), child.counts):
+                cumulative += count
+                labels = _format_labels(self.label_names + ('le',), values + (_format_value(bound),))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.label_names, values)
+            yield f'{self.name}_sum{labels} {_format_value(child.sum)}'
+            yield f'{self.name}_count{labels} {child.count}'
+
+
+class Registry:
+    """
+    A named collection of metrics. Registering a metric twice returns the existing one, so that modules can declare
+    their metrics at import time without coordination.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        if (metric := self._metrics.get(name)) is not None:
+            if not isinstance(metric, cls):
+                raise ValueError(f'{name} is already registered as a {metric.kind}')
+            return metric
+        metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name: str, help_: str, label_names: Optional[list[str]] = None) -> Counter:
+        return self._get_or_create(Counter, name, help_, label_names)
+
+    def gauge(self, name: str, help_: str, label_names: Optional[list[str]] = None) -> Gauge:
+        return self._get_or_create(Gauge, name, help_, label_names)
+
+    def histogram(self, name: str, help_: str, label_names: Optional[list[str]] = None,
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_, label_names, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def to_prometheus_text(self) -> str:
+        return ''.join(metric.expose() + '\n' for metric in list(self._metrics.values()))
+
+
+DEFAULT_REGISTRY = Registry()
+
+
+def write_textfile(path: str, registry: Registry = DEFAULT_REGISTRY):
+    """
+    Write the metrics to a file, atomically, so that a collector never reads a partial file.
+    """
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fp:
+        fp.write(registry.to_prometheus_text())
+    os.replace(tmp, path)
+
+
+async def serve_http(host: str = '127.0.0.1', port: int = 9464, registry: Registry = DEFAULT_REGISTRY
+                     ) -> asyncio.AbstractServer:
+    """
+    Serve the metrics at http://{host}:{port}/metrics until the returned server is closed.
+    """
+
+    async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = '200 OK', registry.to_prometheus_text().encode('utf-8')
+            else:
+                status, body = '404 Not Found', b'not found\n'
+            writer.write(f'HTTP/1.1 {status}\r\n'
+                         f'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                         f'Content-Length: {len(body)}\r\n'
+                         f'Connection: close\r\n\r\n'.encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(_handle, host, port)
@@ -1,8 +1,10 @@
 import asyncio
+from typing import Union
 
 import aiohttp
 
 from konstructcore.datatypes.result import Result
+from konstructcore.tasks.ratelimit import TokenBucket, resolve_rate_limiter
 
 
 class IPAddressAPIError(Exception):
@@ -12,7 +14,8 @@ class IPAddressAPIError(Exception):
     """
 
 
-async def get_host_public_ip(num_retry: int = 10, delay_sec: float = 2.0, apis: list[str] = None) -> Result[str]:
+async def get_host_public_ip(num_retry: int = 10, delay_sec: float = 2.0, apis: list[str] = None,
+                             rate_limit: Union[str, TokenBucket, None] = None) -> Result[str]:
     """
     Asynchronously retrieve the public IP address of the host machine.
     
@@ -24,13 +27,18 @@ async def get_host_public_ip(num_retry: int = 10, delay_sec: float = 2.0, apis:
         - str: The public IP address if successful, empty string if failed
         
     Retries up to {num_retry} times with {delay_sec} second delay between retries.
+
+    If a rate limit is given, as a TokenBucket or the name of a shared one, every request takes a token first.
     """
     apis = apis or ['https://api.ipify.org', 'http://checkip.amazonaws.com']
+    bucket = resolve_rate_limiter(rate_limit)
     async with aiohttp.ClientSession() as session:
         error = None
         # cycle through the existing apis {num_retry} times
         for api_ in apis * num_retry:
             try:
+                if bucket is not None:
+                    await bucket.acquire()
                 async with session.get(api_) as resp:
                     if resp.status != 200:
                         await asyncio.sleep(delay_sec)
@@ -0,0 +1,175 @@
+"""
+Concurrency limiters bound the number of tasks in flight in the runners.
+
+- FixedLimiter: a constant limit, like a semaphore
+- AdaptiveLimiter: a limit adjusted while the tasks run, with an additive-increase/multiplicative-decrease (AIMD)
+  scheme, between a min and a max
+
+The adaptive limiter looks at the completions in windows of about {limit} tasks. At the end of each window:
+
+- the window is congested if the mean latency exceeds the best mean latency seen so far by more than
+  {latency_tolerance} times, or if the last increase of the limit made the throughput drop
+- with back_off_on_timeouts, a task which timed out also makes its window congested. Other failures are ignored:
+  a tool failing on its input says nothing about the load
+- if congested, the limit is multiplied by {backoff} (multiplicative decrease)
+- otherwise the limit grows by one (additive increase)
+
+The best mean latency slowly drifts upward, so that a batch whose tasks get longer over time is not taken for a
+congested one forever.
+
+The current limit is available as limiter.limit, and in the konstruct_concurrency_limit{limiter} gauge.
+
+Example:
+
+    limiter = AdaptiveLimiter('assets', min_limit=2, max_limit=64)
+    results = await run_all(tasks, concurrency=limiter)
+"""
+import asyncio
+import collections
+import time
+from typing import Optional
+
+from konstructcore.metrics.registry import DEFAULT_REGISTRY
+
+CONCURRENCY_LIMIT = DEFAULT_REGISTRY.gauge('konstruct_concurrency_limit', 'Current concurrency limit.', ['limiter'])
+
+
+class ConcurrencyLimiter:
+    """
+    Bound the number of tasks in flight to self.limit.
+
+    Usage:
+
+        await limiter.acquire()
+        start = time.monotonic()
+        result = await task.run()
+        limiter.release(time.monotonic() - start)
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self._limit = max(1, limit)
+        self.in_flight = 0
+        self._waiters: collections.deque[asyncio.Future] = collections.deque()
+        self._gauge = CONCURRENCY_LIMIT.labels(name)
+        self._gauge.set(self._limit)
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def _set_limit(self, limit: int):
+        self._limit = limit
+        self._gauge.set(limit)
+        self._wake()
+
+    def _wake(self):
+        while self.in_flight < self._limit and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def acquire(self):
+        if self.in_flight < self._limit and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was granted right before the cancellation, give it back
+                self.in_flight -= 1
+                self._wake()
+            elif waiter in self._waiters:
+                # a release() may have dropped the cancelled waiter from the queue already
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, latency_sec: Optional[float] = None, timed_out: bool = False):
+        """
+        Give back a slot. The latency of the task, and whether it timed out, feed the adaptation, if any; pass no
+        latency for a task which did not complete (e.g. it was cancelled).
+        """
+        self.in_flight -= 1
+        if latency_sec is not None:
+            self._on_sample(latency_sec, timed_out)
+        self._wake()
+
+    def _on_sample(self, latency_sec: float, timed_out: bool):
+        pass
+
+
+class FixedLimiter(ConcurrencyLimiter):
+
+    def __init__(self, limit: int, name: str = 'fixed'):
+        super().__init__(name, limit)
+
+
+class AdaptiveLimiter(ConcurrencyLimiter):
+    """
+    See the module documentation for the adaptation scheme.
+    """
+
+    def __init__(
+            self,
+            name: str = 'adaptive',
+            min_limit: int = 1,
+            max_limit: int = 256,
+            initial_limit: Optional[int] = None,
+            backoff: float = 0.75,
+            latency_tolerance: float = 2.0,
+            min_window: int = 4,
+            baseline_drift: float = 0.02,
+            back_off_on_timeouts: bool = False,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.min_window = min_window
+        self.baseline_drift = baseline_drift
+        self.back_off_on_timeouts = back_off_on_timeouts
+        super().__init__(name, min(self.max_limit, max(self.min_limit, initial_limit or self.min_limit)))
+        self._baseline_latency: Optional[float] = None
+        self._last_throughput: Optional[float] = None
+        self._increased = False
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._window_latency = 0.0
+        self._window_timeouts = 0
+
+    def _on_sample(self, latency_sec: float, timed_out: bool):
+        self._window_count += 1
+        self._window_latency += latency_sec
+        self._window_timeouts += 1 if timed_out else 0
+        if self._window_count >= max(self.min_window, self._limit):
+            self._adapt()
+
+    def _adapt(self):
+        elapsed = max(time.monotonic() - self._window_start, 1e-9)
+        throughput = self._window_count / elapsed
+        mean_latency = self._window_latency / self._window_count
+        if self._baseline_latency is None:
+            self._baseline_latency = mean_latency
+        else:
+            self._baseline_latency = min(mean_latency, self._baseline_latency * (1 + self.baseline_drift))
+
+        congested = ((self.back_off_on_timeouts and self._window_timeouts > 0)
+                     or mean_latency > self._baseline_latency * self.latency_tolerance
+                     or (self._increased and self._last_throughput is not None
+                         and throughput < self._last_throughput * 0.9))
+        if congested:
+            limit = max(self.min_limit, int(self._limit * self.backoff))
+        else:
+            limit = min(self.max_limit, self._limit + 1)
+        self._increased = limit > self._limit
+        self._last_throughput = throughput
+        self._reset_window()
+        if limit != self._limit:
+            self._set_limit(limit)
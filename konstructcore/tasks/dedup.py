@@ -0,0 +1,73 @@
+"""
+Single-flight de-duplication: identical tasks in flight at the same time share one execution.
+
+Two tasks are identical when they have the same identity() (for ExtTask: the command, cwd, env, output collection
+and resource limits). The first caller runs the task, the callers arriving while it runs wait for it, and all of them
+receive the same Result. Once the execution completes, the next caller runs the task again: nothing is cached. A task
+without an identity (see Task.identity()) is never de-duplicated, it always runs.
+
+The shared execution is cancelled only when all its callers are cancelled.
+
+Example:
+
+    flight = SingleFlight()
+    results = await asyncio.gather(*[flight.run(t) for t in tasks])
+
+    # or, equivalently
+    results = await run_all(tasks, dedup=flight)
+"""
+import asyncio
+from typing import Awaitable, Callable
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.task import Task
+
+
+class _Flight:
+
+    def __init__(self, execution: asyncio.Future):
+        self.execution = execution
+        self.callers = 0
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._flights: dict[str, _Flight] = {}
+        self.executions = 0
+        self.shared = 0
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Result]]) -> Result:
+        """
+        Await fn(), unless an execution under the same key is in flight already, in which case await that one.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(fn()))
+            flight.execution.add_done_callback(lambda _: self._forget(key, flight))
+            self.executions += 1
+        else:
+            self.shared += 1
+        flight.callers += 1
+        try:
+            return await asyncio.shield(flight.execution)
+        except asyncio.CancelledError:
+            flight.callers -= 1
+            if flight.callers == 0:
+                # the next caller must start afresh rather than join a cancelled execution
+                self._forget(key, flight)
+                flight.execution.cancel()
+            raise
+
+    async def run(self, task: Task) -> Result:
+        identity = task.identity()
+        if identity is None:
+            return await task.run()
+        return await self.do(identity, task.run)
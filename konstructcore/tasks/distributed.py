@@ -0,0 +1,459 @@
+"""
+Dispatch tasks to worker agents running on other machines.
+
+A worker agent is a small TCP server which receives tasks, runs them locally with task.run() and sends back their
+Result. A dispatcher connects to a set of agents and spreads the tasks across them:
+
+- Each agent advertises a name, a set of tags and a capacity (the number of tasks it runs at the same time).
+- A task is sent to the least loaded agent, preferring the agents whose name or tags match its locality hint.
+- Agents send heartbeats. An agent which goes silent for longer than the heartbeat timeout, or whose connection
+  drops, is considered lost: the tasks it was running are re-dispatched to the remaining agents.
+
+RemoteTask wraps any task to run it through a dispatcher, so that the existing code calling task.run() (including
+the runners) scales out without being rewritten.
+
+Tasks and Results travel as pickles. The task objects (and the workload of a FutureProcessTask) must be importable
+on the agent side. Unpickling executes code, so an agent without a secret must only be reachable from the local
+machine; sharing a secret between the dispatcher and the agents adds an HMAC to every message, so that the agents
+reject messages from anyone else. The command line refuses to listen beyond the loopback interface without a secret,
+and WorkerAgent.start() logs a warning when it does.
+
+Example:
+
+    # on each build machine
+    python -m konstructcore.tasks.distributed --host 0.0.0.0 --port 7700 --tags linux,gpu --secret-env KONSTRUCT_SECRET
+
+    # on the coordinator
+    async with Dispatcher([('build-01', 7700), ('build-02', 7700)], secret=secret) as dispatcher:
+        results = await run_all([RemoteTask(t, dispatcher, locality='gpu') for t in tasks])
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import itertools
+import logging
+import os
+import pickle
+import socket
+import time
+from typing import Optional
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.task import Task, TaskFailure
+
+_HEADER_SIZE = 4
+_DIGEST_SIZE = hashlib.sha256().digest_size
+_MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+DEFAULT_PORT = 7700
+
+logger = logging.getLogger(__name__)
+
+
+def is_loopback(host: Optional[str]) -> bool:
+    """
+    Whether listening on the given host only accepts connections from the local machine.
+    """
+    if not host:
+        # an empty host listens on every interface
+        return False
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class DispatchError(Exception):
+    """Thrown when a task can not be dispatched to, or executed by, any worker agent."""
+
+
+class WorkerLostError(DispatchError):
+    """Thrown when a worker agent stops responding while running tasks."""
+
+
+class ProtocolError(DispatchError):
+    """Thrown when a peer sends a malformed or unauthenticated message."""
+
+
+async def _read_message(reader: asyncio.StreamReader, secret: Optional[bytes]) -> dict:
+    size = int.from_bytes(await reader.readexactly(_HEADER_SIZE), 'big')
+    if size > _MAX_FRAME_SIZE:
+        raise ProtocolError(f'message too large: {size} bytes')
+    frame = await reader.readexactly(size)
+    if secret is not None:
+        digest, frame = frame[:_DIGEST_SIZE], frame[_DIGEST_SIZE:]
+        if not hmac.compare_digest(digest, hmac.new(secret, frame, hashlib.sha256).digest()):
+            raise ProtocolError('message authentication failed')
+    message = pickle.loads(frame)
+    if not isinstance(message, dict) or 'op' not in message:
+        raise ProtocolError(f'malformed message: {message!r}')
+    return message
+
+
+def _write_message(writer: asyncio.StreamWriter, secret: Optional[bytes], message: dict):
+    """
+    Encode and write a message. The write is synchronous, so that concurrent senders never interleave their frames;
+    the caller is responsible for awaiting writer.drain().
+    """
+    frame = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    if secret is not None:
+        frame = hmac.new(secret, frame, hashlib.sha256).digest() + frame
+    writer.write(len(frame).to_bytes(_HEADER_SIZE, 'big') + frame)
+
+
+class WorkerAgent:
+    """
+    The agent serving tasks on a worker machine.
+
+    Tasks are run with task.run() in the agent's event loop, at most {capacity} at the same time. When a dispatcher
+    disconnects, the tasks it submitted are cancelled (which terminates their process trees).
+    """
+
+    def __init__(
+            self,
+            host: str = '127.0.0.1',
+            port: int = DEFAULT_PORT,
+            name: Optional[str] = None,
+            tags: Optional[list[str]] = None,
+            capacity: Optional[int] = None,
+            heartbeat_interval: float = 1.0,
+            secret: Optional[bytes] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.name = name or socket.gethostname()
+        self.tags = list(tags or [])
+        self.capacity = capacity or os.cpu_count() or 1
+        self.heartbeat_interval = heartbeat_interval
+        self.secret = secret
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._connections: set[asyncio.Task] = set()
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """
+        Return the (host, port) the agent listens on. Useful when the agent is started with port=0.
+        """
+        if self._server is None:
+            return self.host, self.port
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def start(self) -> tuple[str, int]:
+        if self.secret is None and not is_loopback(self.host):
+            logger.warning('worker agent %s listens on %s without a secret: anyone who can reach it can run code '
+                           'on this machine', self.name, self.host)
+        self._semaphore = asyncio.Semaphore(self.capacity)
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        return self.address
+
+    async def stop(self):
+        """
+        Stop listening and drop every connection, cancelling the running tasks.
+        """
+        if self._server is not None:
+            self._server.close()
+        for conn in list(self._connections):
+            conn.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def _run_one(self, writer: asyncio.StreamWriter, task_id: int, payload: bytes):
+        try:
+            task: Task = pickle.loads(payload)
+        except Exception as err:
+            failure = DispatchError(f'Agent {self.name} can not load the task. Error ==> {err}')
+            _write_message(writer, self.secret, dict(op='result', id=task_id, result=Result.err(failure)))
+            await writer.drain()
+            return
+        async with self._semaphore:
+            try:
+                result = await task.run()
+            except Exception as err:
+                result = Result.err(TaskFailure.from_task_and_error(task, err))
+        try:
+            _write_message(writer, self.secret, dict(op='result', id=task_id, result=result))
+        except Exception as err:
+            # most likely the Result can not be pickled
+            failure = DispatchError(f'Agent {self.name} can not send the result of {task.format()}\nError ==> {err}')
+            _write_message(writer, self.secret, dict(op='result', id=task_id, result=Result.err(failure)))
+        await writer.drain()
+
+    async def _heartbeat(self, writer: asyncio.StreamWriter, running: dict):
+        try:
+            while True:
+                _write_message(writer, self.secret, dict(op='heartbeat', in_flight=len(running)))
+                await writer.drain()
+                await asyncio.sleep(self.heartbeat_interval)
+        except ConnectionError:
+            # the connection loop notices it too and cleans up
+            pass
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(asyncio.current_task())
+        running: dict[int, asyncio.Task] = {}
+        heartbeat = None
+        try:
+            hello = dict(op='hello', name=self.name, tags=self.tags, capacity=self.capacity)
+            _write_message(writer, self.secret, hello)
+            heartbeat = asyncio.ensure_future(self._heartbeat(writer, running))
+            while True:
+                message = await _read_message(reader, self.secret)
+                if message['op'] == 'run':
+                    task_id = message['id']
+                    running[task_id] = asyncio.ensure_future(self._run_one(writer, task_id, message['task']))
+                    running[task_id].add_done_callback(lambda _, i=task_id: running.pop(i, None))
+                elif message['op'] == 'cancel':
+                    if (job := running.pop(message['id'], None)) is not None:
+                        job.cancel()
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError, asyncio.CancelledError):
+            pass
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            jobs = list(running.values())
+            for job in jobs:
+                job.cancel()
+            await asyncio.gather(*jobs, return_exceptions=True)
+            writer.close()
+            self._connections.discard(asyncio.current_task())
+
+
+class _WorkerConnection:
+    """
+    The dispatcher side of the connection to a worker agent.
+    """
+
+    def __init__(self, address: tuple[str, int], secret: Optional[bytes]):
+        self.address = address
+        self.secret = secret
+        self.name = f'{address[0]}:{address[1]}'
+        self.tags: set[str] = set()
+        self.capacity = 1
+        self.alive = False
+        self.last_seen = 0.0
+        self.pending: dict[int, asyncio.Future] = {}
+        self._ids = itertools.count()
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    async def connect(self, timeout: float):
+        self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(*self.address), timeout)
+        hello = await asyncio.wait_for(_read_message(self._reader, self.secret), timeout)
+        if hello['op'] != 'hello':
+            raise ProtocolError(f'expected hello from {self.name}, got {hello["op"]}')
+        self.name = hello['name']
+        self.tags = set(hello['tags'])
+        self.capacity = max(1, hello['capacity'])
+        self.alive = True
+        self.last_seen = time.monotonic()
+        self._loop_task = asyncio.ensure_future(self._receive())
+
+    def load(self) -> float:
+        return len(self.pending) / self.capacity
+
+    def matches(self, locality: str) -> bool:
+        return locality == self.name or locality in self.tags
+
+    async def _receive(self):
+        try:
+            while True:
+                message = await _read_message(self._reader, self.secret)
+                self.last_seen = time.monotonic()
+                if message['op'] == 'result':
+                    if (future := self.pending.pop(message['id'], None)) is not None and not future.done():
+                        future.set_result(message['result'])
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError, pickle.UnpicklingError):
+            pass
+        finally:
+            self.mark_lost()
+
+    def mark_lost(self):
+        if not self.alive:
+            return
+        self.alive = False
+        if self._writer is not None:
+            self._writer.close()
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(WorkerLostError(f'worker agent {self.name} is lost'))
+
+    async def close(self):
+        self.mark_lost()
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+
+    async def execute(self, task: Task) -> Result:
+        """
+        Run the task on the agent. Raise WorkerLostError if the agent is lost before the task completes.
+        """
+        task_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[task_id] = future
+        try:
+            # the task is pickled on its own, so that the agent can report a task it can not load
+            payload = pickle.dumps(task, protocol=pickle.HIGHEST_PROTOCOL)
+            _write_message(self._writer, self.secret, dict(op='run', id=task_id, task=payload))
+            await self._writer.drain()
+            return await future
+        except asyncio.CancelledError:
+            if self.alive and self.pending.pop(task_id, None) is not None:
+                _write_message(self._writer, self.secret, dict(op='cancel', id=task_id))
+            raise
+        except ConnectionError:
+            self.mark_lost()
+            raise WorkerLostError(f'worker agent {self.name} is lost')
+        finally:
+            self.pending.pop(task_id, None)
+
+
+class Dispatcher:
+    """
+    Spread tasks across a set of worker agents and collect their Results.
+
+    A task whose agent is lost is re-dispatched to another agent, up to {max_attempts} times. Lost agents are not
+    reconnected; create a new dispatcher to bring them back.
+    """
+
+    def __init__(
+            self,
+            agents: list[tuple[str, int]],
+            heartbeat_timeout: float = 5.0,
+            connect_timeout: float = 10.0,
+            max_attempts: int = 3,
+            secret: Optional[bytes] = None,
+    ):
+        self.agents = agents
+        self.heartbeat_timeout = heartbeat_timeout
+        self.connect_timeout = connect_timeout
+        self.max_attempts = max_attempts
+        self.secret = secret
+        self.workers: list[_WorkerConnection] = []
+        self._watchdog: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> 'Dispatcher':
+        if err := (await self.start()).error:
+            raise err
+        return self
+
+    async def __aexit__(self, *_):
+        await self.stop()
+
+    async def start(self) -> Result:
+        """
+        Connect to the agents. Succeeds if at least one agent is reachable.
+        """
+        workers = [_WorkerConnection(address, self.secret) for address in self.agents]
+        outcomes = await asyncio.gather(*[w.connect(self.connect_timeout) for w in workers], return_exceptions=True)
+        self.workers = [w for w, outcome in zip(workers, outcomes) if outcome is None]
+        if not self.workers:
+            errors = '\n'.join(f'{a[0]}:{a[1]} ==> {o}' for a, o in zip(self.agents, outcomes))
+            return Result.err(DispatchError(f'Failed to connect to any worker agent.\n{errors}'))
+        self._watchdog = asyncio.ensure_future(self._watch_heartbeats())
+        return Result.ok(None)
+
+    async def stop(self):
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            await asyncio.gather(self._watchdog, return_exceptions=True)
+        await asyncio.gather(*[w.close() for w in self.workers])
+
+    def alive_workers(self) -> list[_WorkerConnection]:
+        return [w for w in self.workers if w.alive]
+
+    async def _watch_heartbeats(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_timeout / 4)
+            now = time.monotonic()
+            for worker in self.alive_workers():
+                if now - worker.last_seen > self.heartbeat_timeout:
+                    worker.mark_lost()
+
+    def _pick(self, locality: Optional[str]) -> Optional[_WorkerConnection]:
+        alive = self.alive_workers()
+        if locality is not None:
+            alive = [w for w in alive if w.matches(locality)] or alive
+        return min(alive, key=_WorkerConnection.load, default=None)
+
+    async def submit(self, task: Task, locality: Optional[str] = None) -> Result:
+        """
+        Run the task on a worker agent and return its Result.
+
+        The locality hint is the name or a tag of the preferred agents. If none of them is alive, any agent is used.
+        """
+        error = None
+        for _ in range(self.max_attempts):
+            if (worker := self._pick(locality)) is None:
+                break
+            try:
+                return await worker.execute(task)
+            except WorkerLostError as err:
+                error = err
+            except (pickle.PicklingError, TypeError, AttributeError) as err:
+                return Result.err(DispatchError(f'Task can not be sent to a worker agent.\n{task.format()}\n'
+                                                f'Error ==> {err}'))
+        if error is None:
+            return Result.err(DispatchError(f'No worker agent is available.\n{task.format()}'))
+        return Result.err(DispatchError(f'Task is lost {self.max_attempts} times.\n{task.format()}\n'
+                                        f'Last error ==> {error}'))
+
+
+class RemoteTask(Task):
+    """
+    Run a task through a dispatcher. The wrapped task is sent as is, including its timeout and retry policy, which
+    apply on the agent.
+    """
+
+    def __init__(self, task: Task, dispatcher: Dispatcher, locality: Optional[str] = None):
+        self.task = task
+        self.dispatcher = dispatcher
+        self.locality = locality
+        self.name = getattr(task, 'name', type(task).__name__)
+
+    async def run(self) -> Result:
+        return await self.dispatcher.submit(self.task, self.locality)
+
+    def format(self) -> str:
+        return f'Remote (locality={self.locality}) {self.task.format()}'
+
+    def identity(self) -> Optional[str]:
+        return self.task.identity()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='konstruct worker agent')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--name', default=None)
+    parser.add_argument('--tags', default='', help='comma separated tags used as locality hints')
+    parser.add_argument('--capacity', type=int, default=None)
+    parser.add_argument('--secret-env', default=None, help='name of the environment variable holding the secret')
+    args = parser.parse_args()
+    if args.secret_env is None and not is_loopback(args.host):
+        parser.error(f'--host {args.host} is reachable from other machines, --secret-env is required')
+    secret = os.environ[args.secret_env].encode() if args.secret_env else None
+    agent = WorkerAgent(host=args.host,
+                        port=args.port,
+                        name=args.name,
+                        tags=[t for t in args.tags.split(',') if t],
+                        capacity=args.capacity,
+                        secret=secret)
+    asyncio.run(agent.serve_forever())
+
+
+if __name__ == '__main__':
+    main()
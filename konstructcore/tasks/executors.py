@@ -0,0 +1,79 @@
+"""
+Pick where a workload should run from a hint about what it does.
+
+- Inline: tiny workloads, for which any dispatch costs more than the work itself
+- Thread: I/O-bound workloads and workloads releasing the GIL (hashing, zlib, file I/O)
+- Process: CPU-bound Python code, which needs a process of its own to run in parallel
+
+A process start and the pickling of the workload cost milliseconds, so a CPU-bound workload which is known to be
+short runs inline instead.
+
+Example:
+
+    task = create_task('hash assets', HashWorkload(paths), hint=WorkloadHint.GIL_Releasing)
+    result = await task.run()
+"""
+from typing import Optional, Callable
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.mp_task import FutureProcessTask
+from konstructcore.tasks.retry import RetryPolicy
+from konstructcore.tasks.task import Task
+from konstructcore.tasks.thread_task import FutureThreadTask, InlineTask
+
+# below this expected duration, a process start is not worth it
+PROCESS_MIN_DURATION_SEC = 0.05
+
+
+class WorkloadHint:
+    """
+    What a workload spends its time on.
+    """
+
+    Trivial = 'Trivial'
+    IO_Bound = 'IOBound'
+    GIL_Releasing = 'GILReleasing'
+    CPU_Bound = 'CPUBound'
+
+
+class ExecutorKind:
+    Inline = 'Inline'
+    Thread = 'Thread'
+    Process = 'Process'
+
+
+def select_executor(hint: str, expected_duration_sec: Optional[float] = None) -> str:
+    """
+    Return the ExecutorKind suited to a WorkloadHint.
+    """
+    if hint == WorkloadHint.Trivial:
+        return ExecutorKind.Inline
+    if hint in (WorkloadHint.IO_Bound, WorkloadHint.GIL_Releasing):
+        return ExecutorKind.Thread
+    if hint == WorkloadHint.CPU_Bound:
+        if expected_duration_sec is not None and expected_duration_sec < PROCESS_MIN_DURATION_SEC:
+            return ExecutorKind.Inline
+        return ExecutorKind.Process
+    raise ValueError(f'unknown workload hint: {hint}')
+
+
+def create_task(
+        name: str,
+        workload: Callable[[dict], Result],
+        hint: str,
+        env: Optional[dict] = None,
+        timeout: Optional[float] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        expected_duration_sec: Optional[float] = None,
+) -> Task:
+    """
+    Create an InlineTask, a FutureThreadTask or a FutureProcessTask for the workload, following select_executor().
+
+    Note, an inline task has no timeout.
+    """
+    kind = select_executor(hint, expected_duration_sec)
+    if kind == ExecutorKind.Inline:
+        return InlineTask(name, workload, env=env, retry_policy=retry_policy)
+    if kind == ExecutorKind.Thread:
+        return FutureThreadTask(name, workload, env=env, timeout=timeout, retry_policy=retry_policy)
+    return FutureProcessTask(name, workload, env=env, timeout=timeout, retry_policy=retry_policy)
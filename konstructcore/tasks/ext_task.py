@@ -5,7 +5,16 @@ User defines how to execute an external program and how to handle its I/O.
 The rest is managed by the task object.
 There are two outcomes
 - the task succeeded
-- failed or timed out
+- failed, timed out or was cancelled
+
+The external program is started in its own process group. On timeout or cancellation, the whole process tree is
+terminated (see process_tree.terminate_tree()), not only the direct child.
+
+When the output is not collected, a spawner (see spawn.py) can start the program instead of asyncio, to cut the
+per-spawn latency.
+
+Resource limits (see limits.py) bound the memory, CPU time and open files of the program. A program which runs into
+them fails with TaskFailure.Fail_Resource_Limit.
 
 User can specify a retry policy (backoff, constant sleep time, etc.) to handle failures.
 """
@@ -13,8 +22,12 @@ import asyncio
 from typing import Optional, NamedTuple, Callable
 
 from konstructcore.datatypes.result import Result
+from konstructcore.tasks.limits import ResourceLimits
+from konstructcore.tasks.process_tree import DEFAULT_GRACE_PERIOD_SEC, new_group_kwargs, terminate_tree
 from konstructcore.tasks.retry import RetryPolicy
-from konstructcore.tasks.task import Task, TaskFailure
+from konstructcore.tasks.spawn import Spawner
+from konstructcore.tasks.task import Task, TaskFailure, digest
+from konstructcore.tasks.task_metrics import instrumented, record_retry
 
 
 class ExtTaskOutput(NamedTuple):
@@ -64,6 +77,9 @@ class ExtTask(Task):
             timeout: Optional[float] = None,
             retry_policy: Optional[RetryPolicy] = None,
             collect_output: bool = True,
+            kill_grace_period: float = DEFAULT_GRACE_PERIOD_SEC,
+            spawner: Optional[Spawner] = None,
+            resource_limits: Optional[ResourceLimits] = None,
     ):
         self.name = name
         self.command = command
@@ -72,6 +88,9 @@ class ExtTask(Task):
         self.timeout = timeout
         self.retry_policy = retry_policy
         self.collect_output = collect_output
+        self.kill_grace_period = kill_grace_period
+        self.spawner = spawner
+        self.resource_limits = resource_limits
 
     def command_string(self) -> str:
         """
@@ -81,6 +100,13 @@ class ExtTask(Task):
         s = ' '.join(self.command)
         return f'```{s}```'
 
+    def identity(self) -> str:
+        """
+        Return a digest of the command, cwd, env, output collection and resource limits. The name, timeout and retry
+        policy do not change the work done.
+        """
+        return digest('ExtTask', self.command, self.cwd, self.env, self.collect_output, self.resource_limits)
+
     def format(self) -> str:
         """
         Return a nicely formatted representation of the task
@@ -89,34 +115,50 @@ class ExtTask(Task):
     cwd={self.cwd},
     env={self.env},
     timeout={self.timeout},
-    retry={self.retry_policy}
+    retry={self.retry_policy},
+    limits={self.resource_limits}
     
     {self.command_string()}
 )"""
 
+    async def _spawn(self, collect_output: bool):
+        kwargs = new_group_kwargs()
+        # stderr tells the memory and open file limit violations apart from the other failures
+        capture_stderr = collect_output or self.resource_limits is not None
+        if self.resource_limits is not None:
+            # the limits are applied between the fork and the exec, which a spawner does not allow
+            kwargs['preexec_fn'] = self.resource_limits.preexec_fn()
+        elif not collect_output and self.spawner is not None and self.spawner.supports(self.cwd):
+            return await self.spawner.spawn(self.command, self.cwd, self.env)
+        return await asyncio.create_subprocess_exec(
+            *self.command,
+            cwd=self.cwd,
+            env=self.env,
+            stdout=asyncio.subprocess.PIPE if collect_output else asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE if capture_stderr else asyncio.subprocess.DEVNULL,
+            **kwargs,
+        )
+
     async def _run(self, collect_output: bool = True, retry_policy: Optional[RetryPolicy] = None) -> Result:
         process = None
         try:
-            process = await asyncio.create_subprocess_exec(
-                *self.command,
-                cwd=self.cwd,
-                env=self.env,
-                stdout=asyncio.subprocess.PIPE if collect_output else asyncio.subprocess.DEVNULL,
-                stderr=asyncio.subprocess.PIPE if collect_output else asyncio.subprocess.DEVNULL,
-            )
+            process = await self._spawn(collect_output)
 
             try:
                 stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
             except asyncio.TimeoutError:
-                process.kill()
+                await terminate_tree(process, self.kill_grace_period)
 
-                # If a timeout occurs, it kills the subprocess and waits for the pipes to close properly to
+                # If a timeout occurs, it kills the process tree and waits for the pipes to close properly to
                 # avoid ungraceful exceptions.
                 await process.communicate()
                 return Result.err(ExtTaskFailure.from_task(self, True).with_return_code(process.returncode))
 
             if process.returncode != 0:
                 stderr_str = self._safe_decode(stderr) if stderr else ""
+                if self.resource_limits is not None and (
+                        reason := self.resource_limits.violation(process.returncode, stderr_str)):
+                    return Result.err(ExtTaskFailure.resource_limit(self, reason).with_return_code(process.returncode))
                 return Result.err(
                     ExtTaskFailure.from_task_and_stderr(self, stderr_str).with_return_code(process.returncode))
 
@@ -127,6 +169,12 @@ class ExtTask(Task):
             else:
                 return Result.ok(None)
 
+        except asyncio.CancelledError:
+            if process is not None:
+                await terminate_tree(process, self.kill_grace_period)
+                # reap the leader, it must not stay behind as a zombie
+                await process.wait()
+            raise
         except Exception as e:
             ret = process.returncode if process is not None else -1
             return Result.err(ExtTaskFailure.from_task_and_error(self, e).with_return_code(ret))
@@ -141,6 +189,7 @@ class ExtTask(Task):
         """
         return byte_string.decode('utf-8', errors='replace')
 
+    @instrumented
     async def run(self) -> Result:
         """
         Run will execute the external program with the given command, env, cwd and timeout.
@@ -152,17 +201,25 @@ class ExtTask(Task):
         Result.err(ExtTaskFailure.from_task(task))
         Result.err(ExtTaskFailure.from_task_and_error(task, error))
         Result.err(ExtTaskFailure.from_task_and_stderr(task, stderr))
+
+        If the coroutine is cancelled, the process tree is terminated before CancelledError propagates.
         """
         last_result = None
-        for _ in range(self.retry_policy.num_retries() if self.retry_policy else 1):
+        attempts = self.retry_policy.num_retries() if self.retry_policy else 1
+        for attempt in range(attempts):
             if result := await self._run(collect_output=self.collect_output, retry_policy=self.retry_policy):
                 return result
             else:
                 last_result = result
+                if self.retry_policy and not self.retry_policy.retryable(result.error):
+                    break
                 if self.retry_policy and self.retry_policy.should_retry():
+                    if attempt + 1 < attempts:
+                        record_retry(self.retry_policy)
                     await self.retry_policy.prepare_retry(self)
         return last_result
 
+    @instrumented
     async def run_with(self, f: Callable[[ExtTaskOutput], ExtTaskOutput] = None) -> Result:
         """
         Similar to run, but apply a function to the output of the external program.
@@ -173,7 +230,8 @@ class ExtTask(Task):
         Function f is supposed to be pure: f: ExtTaskOutput -> ExtTaskOutput.
         """
         last_result = None
-        for _ in range(self.retry_policy.num_retries() if self.retry_policy else 1):
+        attempts = self.retry_policy.num_retries() if self.retry_policy else 1
+        for attempt in range(attempts):
             if result := await self._run(collect_output=f is not None, retry_policy=self.retry_policy):
                 if f is not None:
                     try:
@@ -184,6 +242,10 @@ class ExtTask(Task):
                 return result
             else:
                 last_result = result
+                if self.retry_policy and not self.retry_policy.retryable(result.error):
+                    break
                 if self.retry_policy and self.retry_policy.should_retry():
+                    if attempt + 1 < attempts:
+                        record_retry(self.retry_policy)
                     await self.retry_policy.prepare_retry(self)
         return last_result
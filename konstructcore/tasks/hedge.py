@@ -0,0 +1,151 @@
+"""
+Hedged execution cuts the tail latency of a batch caused by a few stragglers (noisy neighbours, slow network mounts).
+
+When a task runs for longer than a threshold, a duplicate attempt (a shallow copy of the task) is launched next to
+it. The first successful Result wins, and the other attempt is cancelled: for an ExtTask, its process tree is
+terminated. The threshold is either fixed, or a percentile of the latencies of the tasks which completed so far under
+the same policy; no hedge is launched until {min_samples} latencies are known.
+
+Only hedge idempotent tasks: both attempts may run to completion side by side. The copy gets its own copy of the
+retry policy of the original, so that the failures of one attempt do not count against the other. An ExtPipeline fed
+from an async iterable is never hedged, as only one attempt can consume the stream.
+
+The result of the winner is returned as soon as it is known. The other attempt is cancelled in the background, and a
+failure while cancelling it is logged.
+
+The hedges launched and won are available as policy.stats(), and in the konstruct_hedges_launched_total and
+konstruct_hedges_won_total counters.
+
+Example:
+
+    policy = HedgePolicy(percentile=95)
+    results = await run_all(tasks, hedge=policy)
+    print(policy.stats())
+"""
+import asyncio
+import copy
+import logging
+import time
+from typing import Optional, NamedTuple
+
+from konstructcore.datatypes.result import Result
+from konstructcore.metrics.hdr import HdrHistogram
+from konstructcore.metrics.registry import DEFAULT_REGISTRY
+from konstructcore.tasks.pipeline import ExtPipeline
+from konstructcore.tasks.task import Task
+
+HEDGES_LAUNCHED = DEFAULT_REGISTRY.counter('konstruct_hedges_launched_total', 'Hedged attempts launched.')
+HEDGES_WON = DEFAULT_REGISTRY.counter('konstruct_hedges_won_total', 'Hedged attempts which beat the original.')
+
+# how often the threshold is re-evaluated while it is not known yet
+_POLL_INTERVAL_SEC = 0.05
+
+logger = logging.getLogger(__name__)
+
+# the cancellations of losing attempts in progress, referenced until they complete
+_CANCELLING: set[asyncio.Future] = set()
+
+
+class HedgeStats(NamedTuple):
+    launched: int
+    won: int
+
+
+class HedgePolicy:
+    """
+    Hedge after {threshold_sec} seconds if given, else after the {percentile} of the latencies seen so far.
+    """
+
+    def __init__(self, percentile: float = 95.0, threshold_sec: Optional[float] = None, min_samples: int = 5):
+        self.percentile = percentile
+        self.threshold_sec = threshold_sec
+        self.min_samples = min_samples
+        self.latency = HdrHistogram()
+        self.launched = 0
+        self.won = 0
+
+    def delay(self) -> Optional[float]:
+        """
+        Return how long a task may run before it is hedged, or None if it is not known yet.
+        """
+        if self.threshold_sec is not None:
+            return self.threshold_sec
+        if self.latency.count < self.min_samples:
+            return None
+        return self.latency.percentile(self.percentile)
+
+    def stats(self) -> HedgeStats:
+        return HedgeStats(self.launched, self.won)
+
+
+def _hedge_of(task: Task) -> Task:
+    hedge = copy.copy(task)
+    if getattr(task, 'retry_policy', None) is not None:
+        hedge.retry_policy = copy.deepcopy(task.retry_policy)
+    return hedge
+
+
+async def _cancel(attempt: asyncio.Future):
+    attempt.cancel()
+    await asyncio.gather(attempt, return_exceptions=True)
+
+
+async def _cancel_loser(task: Task, attempt: asyncio.Future):
+    attempt.cancel()
+    outcome, = await asyncio.gather(attempt, return_exceptions=True)
+    if isinstance(outcome, Exception):
+        logger.warning('the losing attempt of task %s failed while cancelled: %r', getattr(task, 'name', task), outcome)
+
+
+def _cancel_in_background(task: Task, attempt: asyncio.Future):
+    cancelling = asyncio.ensure_future(_cancel_loser(task, attempt))
+    _CANCELLING.add(cancelling)
+    cancelling.add_done_callback(_CANCELLING.discard)
+
+
+async def run_hedged(task: Task, policy: HedgePolicy) -> Result:
+    """
+    Run the task, hedged according to the policy.
+    """
+    if isinstance(task, ExtPipeline) and task.streams_stdin():
+        return await task.run()
+    start = time.monotonic()
+    primary = asyncio.ensure_future(task.run())
+    hedge: Optional[asyncio.Future] = None
+    try:
+        while not primary.done():
+            delay = policy.delay()
+            timeout = _POLL_INTERVAL_SEC if delay is None else start + delay - time.monotonic()
+            if timeout <= 0:
+                hedge = asyncio.ensure_future(_hedge_of(task).run())
+                policy.launched += 1
+                HEDGES_LAUNCHED.inc()
+                break
+            await asyncio.wait([primary], timeout=timeout)
+
+        if hedge is None:
+            result = primary.result()
+        else:
+            done, _ = await asyncio.wait([primary, hedge], return_when=asyncio.FIRST_COMPLETED)
+            first = primary if primary in done else hedge
+            other = hedge if first is primary else primary
+            if first.result().is_err():
+                # a failure does not win while the other attempt may still succeed
+                await asyncio.wait([other])
+                if other.result().is_ok():
+                    first, other = other, first
+            result = first.result()
+            if first is hedge:
+                policy.won += 1
+                HEDGES_WON.inc()
+    except BaseException:
+        # the caller is cancelled or failed: the attempts must not outlive it
+        for attempt in (primary, hedge):
+            if attempt is not None and not attempt.done():
+                await _cancel(attempt)
+        raise
+    policy.latency.record(time.monotonic() - start)
+    for attempt in (primary, hedge):
+        if attempt is not None and not attempt.done():
+            _cancel_in_background(task, attempt)
+    return result
@@ -0,0 +1,228 @@
+"""
+A durable execution journal lets a batch of tasks resume after a crash instead of starting over.
+
+The journal is an append-only file of JSON lines. Each line records the identity of a task (see Task.identity()) and
+its final Result. When a batch is restarted with the same journal, the tasks which already succeeded are not run
+again: their recorded Result is returned instead. The tasks without an identity are not journaled, they always run.
+
+Writes are grouped: the file is fsync-ed once every {sync_every} records or {sync_interval} seconds, whichever comes
+first, and when the journal is closed. When the journal is opened in a running event loop, a background flusher
+syncs the pending records every {sync_interval} seconds, even when no task completes in the meantime. A crash can
+therefore lose the last few records, whose tasks will simply run again on restart.
+
+The following values can be recorded and restored:
+
+- None
+- ExtTaskOutput and ExtPipelineOutput
+- JSON-compatible values (str, int, float, bool, list, dict)
+
+A task whose value can not be serialized is recorded for information, but runs again on restart.
+
+Example:
+
+    async with TaskJournal('/builds/nightly.journal') as journal:
+        results = await run_all(tasks, journal=journal)
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Optional, Any
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.ext_task import ExtTaskOutput, ExtTaskFailure
+from konstructcore.tasks.pipeline import ExtPipelineOutput
+from konstructcore.tasks.task import Task, TaskFailure
+
+
+class JournalError(Exception):
+    """Thrown when the journal file can not be read or written."""
+
+
+class _Unserializable(Exception):
+    pass
+
+
+def _encode_value(value: Any) -> dict:
+    if value is None:
+        return dict(kind='none')
+    if isinstance(value, ExtTaskOutput):
+        return dict(kind='ext_output', stdout=value.stdout, stderr=value.stderr, return_code=value.return_code)
+    if isinstance(value, ExtPipelineOutput):
+        return dict(kind='pipeline_output',
+                    output=_encode_value(value.output),
+                    stages=[encode_result(r) for r in value.stages])
+    try:
+        return dict(kind='json', data=json.loads(json.dumps(value)))
+    except (TypeError, ValueError):
+        raise _Unserializable()
+
+
+def _decode_value(d: dict) -> Any:
+    if d['kind'] == 'none':
+        return None
+    if d['kind'] == 'ext_output':
+        return ExtTaskOutput(d['stdout'], d['stderr'], d['return_code'])
+    if d['kind'] == 'pipeline_output':
+        return ExtPipelineOutput(output=_decode_value(d['output']), stages=[decode_result(r) for r in d['stages']])
+    if d['kind'] == 'json':
+        return d['data']
+    raise _Unserializable()
+
+
+def encode_result(result: Result) -> dict:
+    """
+    Encode a Result as a JSON-compatible dict.
+    """
+    if result.is_err():
+        return dict(ok=False,
+                    error=dict(type=TaskFailure.unwrap_failure_type(result.error),
+                               message=str(result.error),
+                               return_code=getattr(result.error, 'return_code', None)))
+    try:
+        return dict(ok=True, value=_encode_value(result.value))
+    except _Unserializable:
+        return dict(ok=True, value=dict(kind='unserializable', repr=repr(result.value)))
+
+
+def decode_result(d: dict) -> Result:
+    """
+    Decode a Result encoded by encode_result(). The error of a failed Result is restored as an ExtTaskFailure
+    carrying the original failure type, message and return code.
+
+    Raise ValueError if the value of a successful Result could not be serialized in the first place.
+    """
+    if not d['ok']:
+        failure = ExtTaskFailure(d['error']['message']).with_return_code(d['error']['return_code'])
+        failure.failure_type = d['error']['type'] or TaskFailure.Fail_Unspecified
+        return Result.err(failure)
+    try:
+        return Result.ok(_decode_value(d['value']))
+    except _Unserializable:
+        raise ValueError(f'the value is not restorable: {d["value"]}')
+
+
+class TaskJournal:
+    """
+    Append-only record of the task Results, keyed by task identity.
+
+    It is meant to be used by a single process at a time.
+    """
+
+    def __init__(self, path: str, sync_every: int = 64, sync_interval: float = 1.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._completed: dict[str, Result] = {}
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._sync_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> 'TaskJournal':
+        if err := self.open().error:
+            raise err
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    def open(self) -> Result:
+        """
+        Load the existing records, if any, and open the journal for appending.
+
+        A truncated last line, left by a crash in the middle of a write, is ignored.
+        """
+        try:
+            line = '\n'
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as fp:
+                    for line in fp:
+                        self._load_line(line)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if not line.endswith('\n'):
+                # terminate the truncated line, so that the next record starts on a line of its own
+                self._file.write('\n')
+        except OSError as err:
+            return Result.err(JournalError(f'Failed to open the journal {self.path}. Error ==> {err}'))
+        try:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_periodically())
+        except RuntimeError:
+            # no event loop, the records are synced by record() and close() only
+            pass
+        return Result.ok(None)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            if self._unsynced:
+                await self.sync()
+
+    def _load_line(self, line: str):
+        try:
+            record = json.loads(line)
+            result = decode_result(record['result'])
+        except (ValueError, KeyError, TypeError):
+            return
+        if result.is_ok():
+            self._completed[record['id']] = result
+        else:
+            # a failure supersedes an earlier success of the same task
+            self._completed.pop(record['id'], None)
+
+    def lookup(self, task: Task) -> Optional[Result]:
+        """
+        Return the recorded Result if the task already succeeded, otherwise None.
+        """
+        identity = task.identity()
+        return None if identity is None else self._completed.get(identity)
+
+    def num_completed(self) -> int:
+        return len(self._completed)
+
+    async def record(self, task: Task, result: Result):
+        """
+        Append the Result of a task. The record is durable after the next sync. A task without an identity is not
+        recorded.
+        """
+        identity = task.identity()
+        if identity is None:
+            return
+        record = dict(id=identity, name=getattr(task, 'name', None), time=time.time(), result=encode_result(result))
+        self._file.write(json.dumps(record) + '\n')
+        if result.is_ok() and record['result']['value']['kind'] != 'unserializable':
+            self._completed[identity] = result
+        else:
+            self._completed.pop(identity, None)
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            await self.sync()
+
+    async def sync(self):
+        """
+        Flush the pending records and fsync the file.
+
+        A sync requested while another one is in progress waits for it, then syncs the records written since.
+        """
+        async with self._sync_lock:
+            if not self._unsynced:
+                # the previous sync covered every record
+                return
+            self._file.flush()
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+            await asyncio.to_thread(os.fsync, self._file.fileno())
+
+    async def close(self):
+        if self._file is None:
+            return
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        async with self._sync_lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
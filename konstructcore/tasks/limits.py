@@ -0,0 +1,108 @@
+"""
+Resource limits of an external task, enforced by the kernel in the child process.
+
+The limits are applied with setrlimit() in the child, after the fork and before the exec, so they bind the program
+and everything it spawns (each child process gets the same limits, they are not shared):
+
+- address_space_bytes: RLIMIT_AS, the virtual memory of the process; allocations beyond it fail. Linux does not
+  enforce RLIMIT_RSS, the address space is the closest limit it does enforce.
+- cpu_sec: RLIMIT_CPU, the CPU time of the process; the process receives SIGXCPU when it runs out, then SIGKILL one
+  second later.
+- open_files: RLIMIT_NOFILE, the number of open file descriptors.
+- file_size_bytes: RLIMIT_FSIZE, the size of the files written by the process; it receives SIGXFSZ beyond it.
+
+When the program fails because it ran into a limit, the task fails with TaskFailure.Fail_Resource_Limit. A CPU or
+file size violation is recognized by the signal which killed the program, a memory or open file violation by the
+usual error messages on stderr. The stderr of a task with limits is captured for this purpose, even when the task does
+not collect its output. The limits also apply to the stages of an ExtPipeline.
+
+Note, the limits need a fork: the task does not use a spawner (see spawn.py) when it has limits. They are not
+available on Windows.
+
+Example:
+
+    limits = ResourceLimits(address_space_bytes=2 * 1024 ** 3, cpu_sec=600)
+    task = ExtTask('bake', ['bake', 'level.map'], resource_limits=limits,
+                   retry_policy=RetryWithConstantSleep(1, 3, no_retry_on=[TaskFailure.Fail_Resource_Limit]))
+"""
+import signal
+from typing import NamedTuple, Optional, Callable
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_MEMORY_MARKERS = ('memoryerror', 'cannot allocate memory', 'out of memory', 'std::bad_alloc')
+_OPEN_FILES_MARKERS = ('too many open files',)
+
+
+def _killed_by(return_code: int, signal_name: str) -> bool:
+    """
+    Whether the program was killed by the signal, directly or as reported by a shell (128 + signal).
+    """
+    signum = getattr(signal, signal_name, None)
+    return signum is not None and return_code in (-signum, 128 + signum)
+
+
+class ResourceLimits(NamedTuple):
+    address_space_bytes: Optional[int] = None
+    cpu_sec: Optional[int] = None
+    open_files: Optional[int] = None
+    file_size_bytes: Optional[int] = None
+
+    @staticmethod
+    def supported() -> bool:
+        return resource is not None
+
+    def _rlimits(self) -> list[tuple[int, int, int]]:
+        """
+        Return the (resource, soft, hard) triples to set, without raising the current hard limits.
+        """
+        wanted = [
+            (resource.RLIMIT_AS, self.address_space_bytes, 0),
+            (resource.RLIMIT_CPU, self.cpu_sec, 1),
+            (resource.RLIMIT_NOFILE, self.open_files, 0),
+            (resource.RLIMIT_FSIZE, self.file_size_bytes, 0),
+        ]
+        rlimits = []
+        for res, value, hard_margin in wanted:
+            if value is None:
+                continue
+            _, current_hard = resource.getrlimit(res)
+            soft, hard = value, value + hard_margin
+            if current_hard != resource.RLIM_INFINITY:
+                soft, hard = min(soft, current_hard), min(hard, current_hard)
+            rlimits.append((res, soft, hard))
+        return rlimits
+
+    def preexec_fn(self) -> Callable[[], None]:
+        """
+        Return the function applying the limits, to run in the child before the exec.
+        """
+        if resource is None:
+            raise OSError('resource limits are not supported on this platform')
+        rlimits = self._rlimits()
+
+        def _apply():
+            for res, soft, hard in rlimits:
+                resource.setrlimit(res, (soft, hard))
+
+        return _apply
+
+    def violation(self, return_code: Optional[int], stderr: str) -> Optional[str]:
+        """
+        Return which limit the failed program ran into, or None if it does not look like a limit violation.
+        """
+        if return_code is None or return_code == 0:
+            return None
+        if self.cpu_sec is not None and _killed_by(return_code, 'SIGXCPU'):
+            return f'CPU time over {self.cpu_sec}s'
+        if self.file_size_bytes is not None and _killed_by(return_code, 'SIGXFSZ'):
+            return f'file size over {self.file_size_bytes} bytes'
+        lowered = stderr.lower()
+        if self.address_space_bytes is not None and any(m in lowered for m in _MEMORY_MARKERS):
+            return f'address space over {self.address_space_bytes} bytes'
+        if self.open_files is not None and any(m in lowered for m in _OPEN_FILES_MARKERS):
+            return f'open files over {self.open_files}'
+        return None
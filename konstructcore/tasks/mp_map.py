@@ -0,0 +1,254 @@
+"""
+Batched map over a process pool, for data-parallel workloads with many small items.
+
+Running one FutureProcessTask per item costs a task object, a pool and a pickle round trip per item. Instead,
+process_map() splits the items into chunks and sends each chunk to a worker process as a single job, so that the IPC
+cost is amortized over the chunk.
+
+Large payloads are not pickled: bytes-like items (bytes, bytearray, memoryview) and NumPy arrays above a size
+threshold are copied once into a shared memory segment per chunk, and the worker receives zero-copy views on it
+(only the chunks in flight, about twice as many as workers, hold a segment at a time):
+
+- a bytes-like item arrives as a read-only memoryview
+- a NumPy array arrives as a read-only array backed by the shared memory
+
+The views are only valid during the call to the function. The function must copy whatever it needs to keep, and it
+must not return the views themselves.
+
+Like the workload of FutureProcessTask, the function must be picklable and should return a Result. A value which is
+not a Result is wrapped in Result.ok(), and an exception is caught and returned as Result.err().
+
+Example:
+
+    results = await process_map(decimate_mesh, chunks)
+    async for index, result in process_map_stream(decimate_mesh, chunks):
+        ...
+"""
+import asyncio
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Any, Optional, NamedTuple, AsyncIterator
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.mp_task import shutdown_executor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_SHM_THRESHOLD = 64 * 1024
+
+_MAX_CHUNK_SIZE = 1024
+
+# the number of chunks per worker, so that a slow chunk does not keep the other workers idle at the end
+_CHUNKS_PER_WORKER = 4
+
+# the number of chunks in flight per worker, enough to keep the workers busy while bounding the shared memory in use
+_IN_FLIGHT_CHUNKS_PER_WORKER = 2
+
+
+class _SharedRef(NamedTuple):
+    """
+    Stand-in for a payload stored in the shared memory segment of a chunk.
+    """
+    offset: int
+    nbytes: int
+    dtype: Optional[str]
+    shape: Optional[tuple]
+
+
+def _payload_view(item: Any) -> Optional[memoryview]:
+    if isinstance(item, (bytes, bytearray, memoryview)):
+        return memoryview(item).cast('B')
+    if numpy is not None and isinstance(item, numpy.ndarray):
+        return memoryview(numpy.ascontiguousarray(item)).cast('B')
+    return None
+
+
+def _shared_memory(name: Optional[str] = None, size: int = 0) -> shared_memory.SharedMemory:
+    """
+    Create (or attach to) a segment without registering it to the resource tracker when possible (Python 3.13+), as
+    the parent process owns the segment and unlinks it.
+    """
+    create = name is None
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name, create=create, size=size)
+
+
+def _pack(items: list, threshold: int) -> tuple[list, Optional[shared_memory.SharedMemory]]:
+    """
+    Move the large payloads of a chunk into a single shared memory segment, and replace them with references.
+    """
+    views = [_payload_view(item) for item in items]
+    large = [i for i, view in enumerate(views) if view is not None and view.nbytes >= threshold]
+    if not large:
+        return items, None
+    shm = _shared_memory(size=sum(views[i].nbytes for i in large))
+    packed = list(items)
+    offset = 0
+    for i in large:
+        view = views[i]
+        shm.buf[offset:offset + view.nbytes] = view
+        is_array = numpy is not None and isinstance(items[i], numpy.ndarray)
+        packed[i] = _SharedRef(offset,
+                               view.nbytes,
+                               items[i].dtype.str if is_array else None,
+                               items[i].shape if is_array else None)
+        offset += view.nbytes
+    return packed, shm
+
+
+def _unpack(ref: _SharedRef, buf: memoryview) -> Any:
+    view = buf[ref.offset:ref.offset + ref.nbytes].toreadonly()
+    if ref.dtype is None:
+        return view
+    return numpy.frombuffer(view, dtype=ref.dtype).reshape(ref.shape)
+
+
+def _call(fn: Callable[[Any], Any], item: Any) -> Result:
+    try:
+        value = fn(item)
+    except Exception as err:
+        return Result.err(err)
+    return value if isinstance(value, Result) else Result.ok(value)
+
+
+def _run_chunk(fn: Callable[[Any], Any], items: list, shm_name: Optional[str]) -> list[Result]:
+    """
+    Executed in the worker process.
+    """
+    if shm_name is None:
+        return [_call(fn, item) for item in items]
+    shm = _shared_memory(name=shm_name)
+    try:
+        items = [_unpack(item, shm.buf) if isinstance(item, _SharedRef) else item for item in items]
+        results = [_call(fn, item) for item in items]
+        del items
+        return results
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # the function kept a view on the segment, the mapping is released when the process exits
+            pass
+
+
+def _auto_chunk_size(num_items: int, num_workers: int) -> int:
+    size = -(-num_items // (num_workers * _CHUNKS_PER_WORKER))
+    return max(1, min(size, _MAX_CHUNK_SIZE))
+
+
+def _release(shm: shared_memory.SharedMemory):
+    shm.close()
+    shm.unlink()
+
+
+async def _run_chunks(
+        fn: Callable[[Any], Any],
+        items: list,
+        chunk_size: Optional[int],
+        max_workers: Optional[int],
+        shm_threshold: int,
+        executor: Optional[ProcessPoolExecutor],
+) -> AsyncIterator[tuple[int, list[Result]]]:
+    """
+    Yield (start index, results) for each chunk as it completes.
+
+    At most {_IN_FLIGHT_CHUNKS_PER_WORKER} chunks per worker are in flight: a chunk is packed right before it is
+    submitted, and its shared memory segment is released as soon as it completes, so that the input is never copied
+    into shared memory as a whole.
+    """
+    num_workers = max_workers or os.cpu_count() or 1
+    chunk_size = chunk_size or _auto_chunk_size(len(items), num_workers)
+    loop = asyncio.get_running_loop()
+    pool = executor or ProcessPoolExecutor(max_workers=max_workers)
+    starts = iter(range(0, len(items), chunk_size))
+    futures: dict[asyncio.Future, tuple[int, int, Optional[shared_memory.SharedMemory]]] = {}
+    graceful = True
+
+    def _submit(start: int):
+        chunk, shm = _pack(items[start:start + chunk_size], shm_threshold)
+        try:
+            future = loop.run_in_executor(pool, _run_chunk, fn, chunk, shm.name if shm is not None else None)
+        except BaseException:
+            if shm is not None:
+                _release(shm)
+            raise
+        futures[future] = (start, len(chunk), shm)
+
+    try:
+        for start in itertools.islice(starts, num_workers * _IN_FLIGHT_CHUNKS_PER_WORKER):
+            _submit(start)
+        while futures:
+            done, _ = await asyncio.wait(futures, return_when=asyncio.FIRST_COMPLETED)
+            completed = []
+            for future in done:
+                start, size, shm = futures.pop(future)
+                if shm is not None:
+                    _release(shm)
+                try:
+                    results = future.result()
+                except Exception as err:
+                    # the chunk could not be sent or the worker died, every item of the chunk fails
+                    results = [Result.err(err) for _ in range(size)]
+                completed.append((start, results))
+            # refill the pool before handing the results over, the consumer may take its time
+            for start in itertools.islice(starts, len(done)):
+                _submit(start)
+            for start, results in completed:
+                yield start, results
+    except BaseException:
+        graceful = False
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+        if executor is None:
+            shutdown_executor(pool, graceful)
+        for _, _, shm in futures.values():
+            if shm is not None:
+                _release(shm)
+
+
+async def process_map_stream(
+        fn: Callable[[Any], Any],
+        items: list,
+        chunk_size: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        shm_threshold: int = DEFAULT_SHM_THRESHOLD,
+        executor: Optional[ProcessPoolExecutor] = None,
+) -> AsyncIterator[tuple[int, Result]]:
+    """
+    Apply fn to every item in a process pool, yielding (index, Result) as soon as the chunk of the item completes.
+    The order of the items is not preserved.
+
+    If no chunk size is given, it is derived from the number of items and workers. If no executor is given, a pool
+    of {max_workers} processes is created for the call.
+    """
+    async for start, results in _run_chunks(fn, items, chunk_size, max_workers, shm_threshold, executor):
+        for offset, result in enumerate(results):
+            yield start + offset, result
+
+
+async def process_map(
+        fn: Callable[[Any], Any],
+        items: list,
+        chunk_size: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        shm_threshold: int = DEFAULT_SHM_THRESHOLD,
+        executor: Optional[ProcessPoolExecutor] = None,
+) -> list[Result]:
+    """
+    Apply fn to every item in a process pool, and collect their Results in a list following the order of the items.
+
+    See process_map_stream() for the parameters.
+    """
+    results: list[Optional[Result]] = [None] * len(items)
+    async for index, result in process_map_stream(fn, items, chunk_size, max_workers, shm_threshold, executor):
+        results[index] = result
+    return results
@@ -7,6 +7,8 @@ It is up to the workload function or object to decide whether to update its proc
 It must return a Result object with serializable .value attribute.
 
 All the task-level properties are inherited from the base Task class.
+
+If the task is cancelled, the worker process is terminated instead of being left to finish the workload.
 """
 
 import asyncio
@@ -15,7 +17,19 @@ from typing import Optional, Callable
 
 from konstructcore.datatypes.result import Result
 from konstructcore.tasks.retry import RetryPolicy
-from konstructcore.tasks.task import Task
+from konstructcore.tasks.task import Task, digest, workload_digest
+from konstructcore.tasks.task_metrics import instrumented, record_retry
+
+
+def shutdown_executor(pool: ProcessPoolExecutor, graceful: bool = True):
+    """
+    Shut down a process pool. If not graceful, the worker processes are terminated right away instead of being
+    waited for, as a graceful shutdown would block the event loop until the running workloads complete.
+    """
+    if not graceful:
+        for process in list((getattr(pool, '_processes', None) or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=graceful, cancel_futures=not graceful)
 
 
 class FutureProcessTask(Task):
@@ -33,18 +47,48 @@ class FutureProcessTask(Task):
         self.timeout = timeout
         self.retry_policy = retry_policy
 
+    def format(self) -> str:
+        """
+        Return a nicely formatted representation of the task. The env is omitted as it is often a full copy of
+        os.environ.
+        """
+        return f"""Task [{self.name}] (
+    workload={self.workload!r},
+    timeout={self.timeout},
+    retry={self.retry_policy}
+)"""
+
+    def identity(self) -> str:
+        """
+        Return a digest of the pickled workload and env, which is what the worker process receives.
+        """
+        return digest('FutureProcessTask', workload_digest(self.workload), self.env)
+
     async def _run(self) -> Result:
         loop = asyncio.get_running_loop()
-        with ProcessPoolExecutor() as pool:
+        pool = ProcessPoolExecutor()
+        graceful = True
+        try:
             return await loop.run_in_executor(pool, self.workload, self.env)
+        except asyncio.CancelledError:
+            graceful = False
+            raise
+        finally:
+            shutdown_executor(pool, graceful)
 
+    @instrumented
     async def run(self) -> Result:
         last_result = None
-        for _ in range(self.retry_policy.num_retries() if self.retry_policy else 1):
+        attempts = self.retry_policy.num_retries() if self.retry_policy else 1
+        for attempt in range(attempts):
             if result := await self._run():
                 return result
             else:
                 last_result = result
+                if self.retry_policy and not self.retry_policy.retryable(result.error):
+                    break
                 if self.retry_policy and self.retry_policy.should_retry():
+                    if attempt + 1 < attempts:
+                        record_retry(self.retry_policy)
                     await self.retry_policy.prepare_retry(self)
         return last_result
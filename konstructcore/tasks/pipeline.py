@@ -0,0 +1,330 @@
+"""
+An external pipeline connects several external tasks with OS pipes, like `decompress | transform | compress` in a shell.
+
+The stdout of each stage is wired directly to the stdin of the next stage, so the intermediate data flows from
+process to process and never goes through the Python heap. Only the stderr of every stage, and optionally the stdout
+of the last stage, are collected.
+
+The stdin of the first stage can be fed from a file or from an async iterable of bytes. The stdout of the last stage
+can be collected or written to a file.
+
+Like `set -o pipefail`, the pipeline fails if any of its stages fails. Each stage reports its own Result, so that the
+caller can tell which stage broke the pipeline.
+
+The resource limits of a stage (see limits.py) apply to its process, and a stage running into them fails the pipeline
+with TaskFailure.Fail_Resource_Limit.
+
+Example:
+
+    pipeline = ExtPipeline(
+        'repack',
+        stages=[
+            ExtTask('decompress', ['zstd', '-dc']),
+            ExtTask('transform', ['meshtool', 'optimize', '-']),
+            ExtTask('compress', ['zstd', '-c']),
+        ],
+        stdin='/assets/mesh.zst',
+        stdout='/out/mesh.zst',
+    )
+    result = await pipeline.run()
+"""
+import asyncio
+import os
+from typing import Optional, NamedTuple, Callable, Union, AsyncIterable
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.ext_task import ExtTask, ExtTaskOutput, ExtTaskFailure
+from konstructcore.tasks.process_tree import DEFAULT_GRACE_PERIOD_SEC, new_group_kwargs, terminate_tree
+from konstructcore.tasks.retry import RetryPolicy
+from konstructcore.tasks.task import Task, TaskFailure, digest
+from konstructcore.tasks.task_metrics import instrumented, record_retry
+
+PipelineInput = Union[str, os.PathLike, AsyncIterable[bytes]]
+
+
+class ExtPipelineOutput(NamedTuple):
+    """
+    Encapsulates the output of an external pipeline.
+
+    Output: the output of the last stage (its stdout is empty unless collected)
+    Stages: the Result of each stage, in order. Every stage but the last has an empty stdout.
+    """
+
+    output: ExtTaskOutput
+    stages: list[Result]
+
+
+class ExtPipelineFailure(ExtTaskFailure):
+    """
+    Describe how a pipeline failed. The failure type and return code are the ones of the first failing stage.
+
+    The Result of every stage is available in .stages
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.stages = []
+
+    def with_stages(self, stages: list[Result]) -> 'ExtPipelineFailure':
+        self.stages = stages
+        return self
+
+
+class ExtPipeline(Task):
+    """
+    ExtPipeline is an immutable object describing how to execute a chain of external tasks.
+
+    The command, cwd and env of each stage are honored; their timeout and retry policy are not, as the pipeline
+    succeeds or fails as a whole. Use the timeout and retry policy of the pipeline instead.
+
+    Note, a pipeline fed from an async iterable can not be retried, as the iterable is consumed by the first attempt.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            stages: list[ExtTask],
+            stdin: Optional[PipelineInput] = None,
+            stdout: Optional[str] = None,
+            timeout: Optional[float] = None,
+            retry_policy: Optional[RetryPolicy] = None,
+            collect_output: bool = True,
+            kill_grace_period: float = DEFAULT_GRACE_PERIOD_SEC,
+    ):
+        if not stages:
+            raise ValueError('a pipeline requires at least one stage')
+        self.name = name
+        self.stages = stages
+        self.stdin = stdin
+        self.stdout = stdout
+        self.timeout = timeout
+        self.retry_policy = retry_policy
+        self.collect_output = collect_output
+        self.kill_grace_period = kill_grace_period
+
+    def command_string(self) -> str:
+        """
+        Return the pipeline in shell notation, wrapped in a pair of triple-backticks
+        """
+        s = ' | '.join(' '.join(stage.command) for stage in self.stages)
+        return f'```{s}```'
+
+    def streams_stdin(self) -> bool:
+        """
+        Whether the pipeline is fed from an async iterable, which only one run can consume.
+        """
+        return self.stdin is not None and not isinstance(self.stdin, (str, os.PathLike))
+
+    def identity(self) -> Optional[str]:
+        """
+        Return a digest of the stages, the input and output files and the output collection. A pipeline fed from an
+        async iterable has no identity, as the content of the stream is unknown.
+        """
+        if self.streams_stdin():
+            return None
+        stdin = None if self.stdin is None else os.fspath(self.stdin)
+        return digest('ExtPipeline', [stage.identity() for stage in self.stages], stdin, self.stdout,
+                      self.collect_output)
+
+    def format(self) -> str:
+        """
+        Return a nicely formatted representation of the pipeline
+        """
+        return f"""Pipeline [{self.name}] (
+    stdin={self.stdin},
+    stdout={self.stdout},
+    timeout={self.timeout},
+    retry={self.retry_policy}
+
+    {self.command_string()}
+)"""
+
+    @staticmethod
+    async def _feed(stream: asyncio.StreamWriter, source: AsyncIterable[bytes]):
+        try:
+            async for chunk in source:
+                stream.write(chunk)
+                await stream.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # the first stage exited without reading all of its input, its return code tells the rest
+            pass
+        finally:
+            stream.close()
+
+    @staticmethod
+    async def _collect(process: asyncio.subprocess.Process) -> tuple[bytes, bytes]:
+        async def _read(stream: Optional[asyncio.StreamReader]) -> bytes:
+            return await stream.read() if stream is not None else b''
+
+        stdout, stderr, _ = await asyncio.gather(_read(process.stdout), _read(process.stderr), process.wait())
+        return stdout, stderr
+
+    async def _terminate(self, processes: list[asyncio.subprocess.Process]):
+        await asyncio.gather(*[terminate_tree(p, self.kill_grace_period) for p in processes])
+        await asyncio.gather(*[p.wait() for p in processes])
+
+    def _stage_result(self, stage: ExtTask, process: asyncio.subprocess.Process, stdout: bytes,
+                      stderr: bytes) -> Result:
+        stderr_str = ExtTask._safe_decode(stderr) if stderr else ''
+        if process.returncode != 0:
+            if stage.resource_limits is not None and (
+                    reason := stage.resource_limits.violation(process.returncode, stderr_str)):
+                return Result.err(ExtTaskFailure.resource_limit(stage, reason).with_return_code(process.returncode))
+            failure = ExtTaskFailure.from_task_and_stderr(stage, stderr_str)
+            return Result.err(failure.with_return_code(process.returncode))
+        stdout_str = ExtTask._safe_decode(stdout) if stdout else ''
+        return Result.ok(ExtTaskOutput(stdout_str, stderr_str, process.returncode))
+
+    def _failure(self, stages: list[Result]) -> Result:
+        failed = [(i, r) for i, r in enumerate(stages) if r.is_err()]
+        i, first = failed[0]
+        lines = '\n'.join(f'stage {i} [{self.stages[i].name}] ==> {r.error}' for i, r in failed)
+        failure = ExtPipelineFailure(f'External pipeline fails to run.\n{self.format()}\n{lines}')
+        failure.failure_type = TaskFailure.unwrap_failure_type(first.error) or TaskFailure.Fail_Unspecified
+        return Result.err(
+            failure.with_return_code(getattr(first.error, 'return_code', None)).with_stages(stages))
+
+    async def _run(self, collect_output: bool = True) -> Result:
+        processes: list[asyncio.subprocess.Process] = []
+        # file descriptors owned by the parent, which must be closed once handed over to the children
+        fds: list[int] = []
+        files = []
+        feeder = None
+        try:
+            if self.stdin is None:
+                stdin = asyncio.subprocess.DEVNULL
+            elif isinstance(self.stdin, (str, os.PathLike)):
+                files.append(open(self.stdin, 'rb'))
+                stdin = files[-1]
+            else:
+                stdin = asyncio.subprocess.PIPE
+
+            for i, stage in enumerate(self.stages):
+                read_fd = None
+                if i < len(self.stages) - 1:
+                    read_fd, write_fd = os.pipe()
+                    fds += [read_fd, write_fd]
+                    stdout = write_fd
+                elif self.stdout is not None:
+                    files.append(open(self.stdout, 'wb'))
+                    stdout = files[-1]
+                else:
+                    stdout = asyncio.subprocess.PIPE if collect_output else asyncio.subprocess.DEVNULL
+
+                kwargs = new_group_kwargs()
+                if stage.resource_limits is not None:
+                    kwargs['preexec_fn'] = stage.resource_limits.preexec_fn()
+                processes.append(await asyncio.create_subprocess_exec(
+                    *stage.command,
+                    cwd=stage.cwd,
+                    env=stage.env,
+                    stdin=stdin,
+                    stdout=stdout,
+                    stderr=asyncio.subprocess.PIPE,
+                    **kwargs,
+                ))
+                # the parent must not keep the pipe ends open, otherwise the readers never see EOF
+                for fd in (stdin, stdout):
+                    if isinstance(fd, int) and fd in fds:
+                        os.close(fd)
+                        fds.remove(fd)
+                stdin = read_fd
+
+            if processes[0].stdin is not None:
+                feeder = asyncio.ensure_future(self._feed(processes[0].stdin, self.stdin))
+
+            try:
+                outputs = await asyncio.wait_for(asyncio.gather(*[self._collect(p) for p in processes]),
+                                                 timeout=self.timeout)
+            except asyncio.TimeoutError:
+                await self._terminate(processes)
+                return Result.err(ExtTaskFailure.from_task(self, True).with_return_code(processes[-1].returncode))
+
+            # the first stage only sees EOF once the feeder is done, so a failed source is known by now
+            if feeder is not None and feeder.done() and not feeder.cancelled() and feeder.exception() is not None:
+                return Result.err(ExtTaskFailure.from_task_and_error(self, feeder.exception())
+                                  .with_return_code(processes[-1].returncode))
+
+            stages = [self._stage_result(stage, process, stdout, stderr)
+                      for stage, process, (stdout, stderr) in zip(self.stages, processes, outputs)]
+            if any(r.is_err() for r in stages):
+                return self._failure(stages)
+            if not collect_output:
+                return Result.ok(None)
+            return Result.ok(ExtPipelineOutput(output=stages[-1].value, stages=stages))
+
+        except asyncio.CancelledError:
+            await self._terminate(processes)
+            raise
+        except Exception as e:
+            await self._terminate(processes)
+            ret = processes[-1].returncode if processes else -1
+            return Result.err(ExtTaskFailure.from_task_and_error(self, e).with_return_code(ret))
+        finally:
+            if feeder is not None:
+                if not feeder.done():
+                    feeder.cancel()
+                elif not feeder.cancelled():
+                    # retrieved, so that a source failure after a timeout or a stage failure is not logged as unhandled
+                    feeder.exception()
+            for fd in fds:
+                os.close(fd)
+            for file in files:
+                file.close()
+
+    @instrumented
+    async def run(self) -> Result:
+        """
+        Run all the stages of the pipeline concurrently, with each stdout connected to the stdin of the next stage.
+
+        If all the stages succeed, return Result.ok(ExtPipelineOutput);
+        or if not collect output, return Result.ok(None)
+
+        If any stage fails, return Result.err(ExtPipelineFailure) which carries the Result of each stage.
+        If the pipeline times out or can not be started, return Result.err(ExtTaskFailure)
+
+        On timeout or cancellation, the process tree of every stage is terminated.
+        """
+        last_result = None
+        attempts = self.retry_policy.num_retries() if self.retry_policy else 1
+        for attempt in range(attempts):
+            if result := await self._run(collect_output=self.collect_output):
+                return result
+            else:
+                last_result = result
+                if self.retry_policy and not self.retry_policy.retryable(result.error):
+                    break
+                if self.retry_policy and self.retry_policy.should_retry():
+                    if attempt + 1 < attempts:
+                        record_retry(self.retry_policy)
+                    await self.retry_policy.prepare_retry(self)
+        return last_result
+
+    @instrumented
+    async def run_with(self, f: Callable[[ExtTaskOutput], ExtTaskOutput] = None) -> Result:
+        """
+        Similar to run, but apply a function to the output of the last stage.
+        If no function is given, it will discard the output of the pipeline.
+
+        Note, the failure of f is NOT retryable and if throws an exception will be caught and propagated immediately.
+        """
+        last_result = None
+        attempts = self.retry_policy.num_retries() if self.retry_policy else 1
+        for attempt in range(attempts):
+            if result := await self._run(collect_output=f is not None):
+                if f is not None:
+                    try:
+                        return Result.ok(f(result.value.output))
+                    except Exception as err:
+                        return Result.err(ExtTaskFailure.cannot_process_output(self, err).with_return_code(
+                            result.value.output.return_code))
+                return result
+            else:
+                last_result = result
+                if self.retry_policy and not self.retry_policy.retryable(result.error):
+                    break
+                if self.retry_policy and self.retry_policy.should_retry():
+                    if attempt + 1 < attempts:
+                        record_retry(self.retry_policy)
+                    await self.retry_policy.prepare_retry(self)
+        return last_result
@@ -0,0 +1,75 @@
+"""
+process tree management
+
+An external program is often a wrapper script spawning more programs. Killing the direct child is not enough to stop
+the work: the grandchildren are re-parented and keep running.
+
+Each child is started as the leader of its own process group (its own session on POSIX), so that the whole tree can be
+signaled at once: first a graceful signal, then SIGKILL for whatever is still alive after a grace period.
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+DEFAULT_GRACE_PERIOD_SEC = 5.0
+
+_POLL_INTERVAL_SEC = 0.05
+
+
+def new_group_kwargs() -> dict:
+    """
+    Return the keyword arguments to pass to asyncio.create_subprocess_exec() (or subprocess.Popen()) to start the
+    child in a new process group.
+    """
+    if sys.platform == 'win32':
+        return dict(creationflags=subprocess.CREATE_NEW_PROCESS_GROUP)
+    return dict(start_new_session=True)
+
+
+def _group_alive(pgid: int) -> bool:
+    try:
+        os.killpg(pgid, 0)
+    except (ProcessLookupError, PermissionError):
+        return False
+    return True
+
+
+def _signal_group(pgid: int, sig: int):
+    try:
+        os.killpg(pgid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _terminate_tree_win32(process: asyncio.subprocess.Process):
+    killer = await asyncio.create_subprocess_exec(
+        'taskkill', '/F', '/T', '/PID', str(process.pid),
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    await killer.wait()
+    if process.returncode is None:
+        process.kill()
+
+
+async def terminate_tree(process: asyncio.subprocess.Process, grace_period: float = DEFAULT_GRACE_PERIOD_SEC):
+    """
+    Terminate the process group led by the given process, which must have been started with new_group_kwargs().
+
+    On POSIX, the group receives SIGTERM, then SIGKILL if any member is still alive after {grace_period} seconds.
+    On Windows, the tree is killed with `taskkill /T /F` right away as there is no equivalent of SIGTERM.
+
+    It is safe to call on a process which has already exited: its orphaned descendants are still terminated.
+    """
+    if sys.platform == 'win32':
+        await _terminate_tree_win32(process)
+        return
+    pgid = process.pid
+    _signal_group(pgid, signal.SIGTERM)
+    deadline = time.monotonic() + grace_period
+    while time.monotonic() < deadline and _group_alive(pgid):
+        await asyncio.sleep(_POLL_INTERVAL_SEC)
+    _signal_group(pgid, signal.SIGKILL)
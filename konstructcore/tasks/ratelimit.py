@@ -0,0 +1,210 @@
+"""
+Rate limiters pace the access to rate-limited shared resources: artifact stores, license servers, public APIs.
+
+A TokenBucket holds up to {burst} tokens and gains {rate} tokens per second. Each access takes a token, and waits
+for one when the bucket is empty. The callers are served in order, so that a steady flow of small requests can not
+starve the others.
+
+The buckets are shared by name: rate_limiter('licenses', rate=2, burst=4) creates or reconfigures the bucket named
+'licenses', and rate_limiter('licenses') returns it wherever it is needed. The tasks and runners accept a bucket or
+a bucket name:
+
+    rate_limiter('artifacts', rate=50, burst=10)
+    results = await run_all(upload_tasks, rate_limit='artifacts')
+    result = await RateLimitedTask(checkout_task, 'licenses').run()
+
+The time spent waiting for tokens is available as bucket.stats(), and in the konstruct_rate_limit_wait_seconds
+{limiter} histogram.
+"""
+import asyncio
+import collections
+import time
+from typing import Optional, Union, Callable, NamedTuple
+
+from konstructcore.datatypes.result import Result
+from konstructcore.metrics.registry import DEFAULT_REGISTRY
+from konstructcore.tasks.task import Task
+
+RATE_LIMIT_WAIT = DEFAULT_REGISTRY.histogram('konstruct_rate_limit_wait_seconds',
+                                             'Time spent waiting for a rate limit token.', ['limiter'])
+
+
+class RateLimitStats(NamedTuple):
+    acquired: int
+    waited: int
+    total_wait_sec: float
+    max_wait_sec: float
+
+    def mean_wait_sec(self) -> float:
+        return self.total_wait_sec / self.acquired if self.acquired else 0.0
+
+
+class TokenBucket:
+    """
+    Allow {rate} acquisitions per second on average, and up to {burst} at once. See the module documentation.
+    """
+
+    def __init__(self, name: str, rate: float, burst: Optional[int] = None):
+        if rate <= 0:
+            raise ValueError(f'the rate of a rate limiter must be positive, got {rate}')
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst if burst is not None else 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        # the callers waiting in order, the first one waits for the tokens; created on the running loop of each caller
+        self._waiters: collections.deque[asyncio.Future] = collections.deque()
+        self._wakeup: Optional[asyncio.Future] = None
+        self._acquired = 0
+        self._waited = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._histogram = RATE_LIMIT_WAIT.labels(name)
+
+    def configure(self, rate: float, burst: Optional[int] = None):
+        if rate <= 0:
+            raise ValueError(f'the rate of a rate limiter must be positive, got {rate}')
+        self._refill()
+        self.rate = rate
+        self.burst = max(1, burst if burst is not None else self.burst)
+        self._tokens = min(self._tokens, self.burst)
+        # the first waiter re-checks its wait against the new rate and burst
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _check_tokens(self, tokens: int):
+        # the bucket never holds more than {burst} tokens, more could never be taken
+        if tokens > self.burst:
+            raise ValueError(f'can not take {tokens} tokens at once from rate limiter {self.name!r} '
+                             f'with a burst of {self.burst}')
+
+    def try_acquire(self, tokens: int = 1) -> bool:
+        """
+        Take the tokens if they are available right now, without waiting.
+        """
+        self._check_tokens(tokens)
+        if self._waiters:
+            return False
+        self._refill()
+        if self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        self._record(0.0)
+        return True
+
+    async def acquire(self, tokens: int = 1):
+        """
+        Wait until the tokens are available, then take them. The callers are served in order.
+        """
+        self._check_tokens(tokens)
+        start = time.monotonic()
+        if not self._waiters:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self._record(0.0)
+                return
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            if self._waiters[0] is waiter:
+                waiter.set_result(None)
+            else:
+                await waiter
+            while True:
+                # the burst may have been lowered by configure() in the meantime
+                self._check_tokens(tokens)
+                self._refill()
+                if self._tokens >= tokens:
+                    break
+                await self._sleep(loop, (tokens - self._tokens) / self.rate)
+            self._tokens -= tokens
+        finally:
+            self._waiters.remove(waiter)
+            if self._waiters and not self._waiters[0].done():
+                self._waiters[0].set_result(None)
+        self._record(time.monotonic() - start)
+
+    async def _sleep(self, loop: asyncio.AbstractEventLoop, delay: float):
+        """
+        Sleep for the delay, or until configure() is called.
+        """
+        self._wakeup = loop.create_future()
+        handle = loop.call_later(delay, lambda f: f.done() or f.set_result(None), self._wakeup)
+        try:
+            await self._wakeup
+        finally:
+            handle.cancel()
+            self._wakeup = None
+
+    def _record(self, wait_sec: float):
+        self._acquired += 1
+        if wait_sec > 0:
+            self._waited += 1
+            self._total_wait += wait_sec
+            self._max_wait = max(self._max_wait, wait_sec)
+        self._histogram.observe(wait_sec)
+
+    def stats(self) -> RateLimitStats:
+        return RateLimitStats(self._acquired, self._waited, self._total_wait, self._max_wait)
+
+
+_BUCKETS: dict[str, TokenBucket] = {}
+
+
+def rate_limiter(name: str, rate: Optional[float] = None, burst: Optional[int] = None) -> TokenBucket:
+    """
+    Return the bucket shared under the given name.
+
+    With a rate, the bucket is created, or reconfigured if it exists. Without, it must exist already.
+    """
+    bucket = _BUCKETS.get(name)
+    if rate is None:
+        if bucket is None:
+            raise KeyError(f'no rate limiter named {name!r}, create it with a rate first')
+        return bucket
+    if bucket is None:
+        bucket = _BUCKETS[name] = TokenBucket(name, rate, burst)
+    else:
+        bucket.configure(rate, burst)
+    return bucket
+
+
+def resolve_rate_limiter(limit: Union[str, TokenBucket, None]) -> Optional[TokenBucket]:
+    """
+    Return the bucket for a bucket name, a bucket or None.
+    """
+    return rate_limiter(limit) if isinstance(limit, str) else limit
+
+
+class RateLimitedTask(Task):
+    """
+    Take a token from the rate limiter before each run of the wrapped task.
+
+    Note, the retries of the wrapped task happen within one run, and are not paced.
+    """
+
+    def __init__(self, task: Task, limit: Union[str, TokenBucket]):
+        self.task = task
+        self.limit = limit
+        self.name = getattr(task, 'name', None)
+
+    def format(self) -> str:
+        return self.task.format()
+
+    def identity(self) -> Optional[str]:
+        return self.task.identity()
+
+    async def run(self) -> Result:
+        await resolve_rate_limiter(self.limit).acquire()
+        return await self.task.run()
+
+    async def run_with(self, f: Callable) -> Result:
+        await resolve_rate_limiter(self.limit).acquire()
+        return await self.task.run_with(f)
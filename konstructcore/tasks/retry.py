@@ -2,15 +2,26 @@
 The concept of retry is an important part of a task system because all the async/IO tasks can fail.
 
 A retry policy describes how a task and its subtasks should be retried.
+
+Some failures are not worth a retry: a task which exceeded its resource limits will exceed them again. The policies
+accept the failure types (see TaskFailure) which they should not retry in {no_retry_on}.
 """
 
 import asyncio
-from typing import Callable
+from typing import Callable, Iterable, Optional
 
-from konstructcore.tasks.task import Task
+from konstructcore.tasks.task import Task, TaskFailure
 
 
 class RetryPolicy:
+    no_retry_on: frozenset = frozenset()
+
+    def retryable(self, error) -> bool:
+        """
+        Whether a failure with the given error is worth a retry. By default, any failure whose type is not in
+        self.no_retry_on.
+        """
+        return TaskFailure.unwrap_failure_type(error) not in self.no_retry_on
 
     def should_retry(self) -> bool:
         raise NotImplementedError()
@@ -27,11 +38,13 @@ class RetryPolicy:
 
 class RetryWithConstantSleep(RetryPolicy):
 
-    def __init__(self, sleep_sec: float, retries: int, cb: Callable[[Task, int], None]=None):
+    def __init__(self, sleep_sec: float, retries: int, cb: Callable[[Task, int], None]=None,
+                 no_retry_on: Optional[Iterable[str]] = None):
         self.sleep_sec = sleep_sec
         self.retries = retries
         self.failures = 0
         self.callback = cb
+        self.no_retry_on = frozenset(no_retry_on or ())
 
     def should_retry(self) -> bool:
         return True
@@ -54,7 +67,8 @@ class RetryWithConstantSleep(RetryPolicy):
 
 class ExponentialBackoffRetry(RetryPolicy):
 
-    def __init__(self, base_sleep_sec: float, exp: float, max_retries: int, cb: Callable[[Task, int], None]=None):
+    def __init__(self, base_sleep_sec: float, exp: float, max_retries: int, cb: Callable[[Task, int], None]=None,
+                 no_retry_on: Optional[Iterable[str]] = None):
         """
         exp is expected to be greater than 1, such as 1.5, 1.75
 
@@ -68,6 +82,7 @@ class ExponentialBackoffRetry(RetryPolicy):
         self.max_retries = max_retries
         self.failures = 0
         self.callback = cb
+        self.no_retry_on = frozenset(no_retry_on or ())
 
     def should_retry(self) -> bool:
         return True
@@ -2,36 +2,207 @@
 provide more advanced features for running the tasks
 """
 import asyncio
-from typing import Optional
-
-import more_itertools
+import itertools
+import time
+from typing import Optional, Union, NamedTuple
 
 from konstructcore.datatypes.result import Result
+from konstructcore.metrics.hdr import HdrHistogram
+from konstructcore.tasks.concurrency import ConcurrencyLimiter, FixedLimiter
+from konstructcore.tasks.dedup import SingleFlight
+from konstructcore.tasks.hedge import HedgePolicy, run_hedged
+from konstructcore.tasks.journal import TaskJournal
+from konstructcore.tasks.ratelimit import TokenBucket, resolve_rate_limiter
 from konstructcore.tasks.task import Task, TaskFailure
 
 
-async def run_all(tasks: list[Task]) -> list[Result]:
+async def run_all(
+        tasks: list[Task],
+        fail_fast: bool = False,
+        journal: Optional[TaskJournal] = None,
+        concurrency: Union[int, ConcurrencyLimiter, None] = None,
+        rate_limit: Union[str, TokenBucket, None] = None,
+        dedup: Union[bool, SingleFlight] = False,
+        hedge: Optional[HedgePolicy] = None,
+) -> list[Result]:
     """
     Run all the tasks to completion or failure.
     Collect their results in a list following the order of the tasks.
+
+    If fail_fast is set, the first failure cancels all the tasks still running. Their results are
+    Result.err(TaskFailure.cancelled(task)).
+
+    If a journal is given, the tasks which already succeeded according to the journal are not run again, their
+    recorded Result is returned instead. The Result of every task which runs is recorded in the journal.
+
+    The number of tasks in flight is unbounded by default. Pass an int for a fixed limit, or a ConcurrencyLimiter
+    such as an AdaptiveLimiter (see concurrency.py).
+
+    If a rate limit is given, as a TokenBucket or the name of a shared one, each task takes a token before it starts
+    (see ratelimit.py). The token is taken once the task has its concurrency slot, so that the tasks held back by
+    the concurrency limit do not start in a burst later on.
+
+    If dedup is set, or is a SingleFlight shared with other callers, the tasks with the same identity() which are in
+    flight at the same time share one execution and the same Result (see dedup.py). The tasks without an identity are
+    not de-duplicated.
+
+    If a hedge policy is given, a duplicate attempt is launched for each task which runs past the threshold of the
+    policy, and the first successful attempt wins (see hedge.py). Only use it for idempotent tasks. The duplicate
+    attempt shares the concurrency slot of the original.
     """
-    return await asyncio.gather(*[t.run() for t in tasks])
+    limiter = FixedLimiter(concurrency) if isinstance(concurrency, int) else concurrency
+    bucket = resolve_rate_limiter(rate_limit)
+    flight = SingleFlight() if dedup is True else (dedup or None)
+
+    async def _run_paced(task: Task) -> Result:
+        if bucket is not None:
+            await bucket.acquire()
+        if hedge is not None:
+            return await run_hedged(task, hedge)
+        return await task.run()
+
+    async def _run_limited(task: Task) -> Result:
+        if limiter is None:
+            return await _run_paced(task)
+        await limiter.acquire()
+        start = time.monotonic()
+        try:
+            result = await _run_paced(task)
+        except BaseException:
+            limiter.release()
+            raise
+        limiter.release(time.monotonic() - start,
+                        TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Time_Out)
+        return result
+
+    async def _run_journaled(task: Task) -> Result:
+        if journal is not None and (recorded := journal.lookup(task)) is not None:
+            return recorded
+        result = await _run_limited(task)
+        if journal is not None:
+            await journal.record(task, result)
+        return result
+
+    async def _run(task: Task) -> Result:
+        identity = task.identity() if flight is not None else None
+        if identity is None:
+            return await _run_journaled(task)
+        return await flight.do(identity, lambda: _run_journaled(task))
+
+    if not fail_fast:
+        return await asyncio.gather(*[_run(t) for t in tasks])
+
+    futures = [asyncio.ensure_future(_run(t)) for t in tasks]
+    try:
+        for next_done in asyncio.as_completed(futures):
+            if (await next_done).is_err():
+                break
+    finally:
+        # also reached when run_all itself is cancelled, the tasks must not outlive it
+        for fut in futures:
+            fut.cancel()
+        await asyncio.gather(*futures, return_exceptions=True)
+    return [Result.err(TaskFailure.cancelled(task)) if fut.cancelled() else fut.result()
+            for task, fut in zip(tasks, futures)]
 
 
-async def repeat(task: Task, count: Optional[int] = None) -> Result:
+class RepeatSummary(NamedTuple):
+    """
+    The statistics of a repeat() run. The latencies are in seconds.
+    """
+    successes: int
+    failures: int
+    elapsed_sec: float
+    latency: HdrHistogram
+
+    def achieved_rate(self) -> float:
+        """
+        Return the number of completed runs per second
+        """
+        return (self.successes + self.failures) / self.elapsed_sec if self.elapsed_sec > 0 else 0.0
+
+    def format(self) -> str:
+        return (f'{self.successes} succeeded, {self.failures} failed in {self.elapsed_sec:.3f}s '
+                f'({self.achieved_rate():.1f}/s), latency: {self.latency.format()}')
+
+
+async def repeat(
+        task: Task,
+        count: Optional[int] = None,
+        interval: Optional[float] = None,
+        rate: Optional[float] = None,
+        concurrency: int = 1,
+        duration: Optional[float] = None,
+        stop_on_failure: bool = True,
+) -> Result:
     """
     Repeatedly execute a task until:
     - It reaches the specified number of times (if provided)
-    - It runs into a failure as Result.err
-    - It runs into an exception, which is caught and returned as Result.err
+    - It runs for the specified duration in seconds (if provided)
+    - It runs into a failure as Result.err, unless stop_on_failure is unset
+    - It runs into an exception, which is caught and returned as Result.err, unless stop_on_failure is unset
+
+    By default, the runs follow each other back-to-back. With an interval in seconds, or a rate in runs per second,
+    the runs start on a fixed schedule: the i-th run is due at start + i * interval, so that the schedule does not
+    drift with the duration of the runs. Up to {concurrency} runs are in flight at a time.
+
+    On a schedule, the latency of a run is measured from its due time rather than from its actual start, so that
+    the delay of a run held back by the previous ones counts in the statistics (coordinated omission).
+
+    Return Result.ok(RepeatSummary) when done, or the first failure if stop_on_failure is set.
     """
-    if count is None:
-        it = more_itertools.repeat_last(range(1), 0)
-    else:
-        it = range(count)
+    if rate is not None:
+        interval = 1.0 / rate
+    slots = asyncio.Semaphore(max(1, concurrency))
+    latency = HdrHistogram()
+    outcomes = dict(successes=0, failures=0)
+    first_failure: Optional[Result] = None
+    in_flight: set[asyncio.Future] = set()
+
+    async def _run_once(due: float):
+        nonlocal first_failure
+        try:
+            result = await task.run()
+        except Exception as err:
+            result = Result.err(TaskFailure.from_task_and_error(task, err))
+        finally:
+            slots.release()
+        latency.record(time.monotonic() - due)
+        if result.is_ok():
+            outcomes['successes'] += 1
+        else:
+            outcomes['failures'] += 1
+            if first_failure is None:
+                first_failure = result
+
+    def _stopped() -> bool:
+        return stop_on_failure and first_failure is not None
+
+    start = time.monotonic()
     try:
-        for _ in it:
-            if (result := await task.run()).is_err():
-                return result
-    except Exception as err:
-        return Result.err(TaskFailure.from_task_and_error(task, err))
+        for i in itertools.count():
+            if (count is not None and i >= count) or _stopped():
+                break
+            if interval is not None:
+                due = start + i * interval
+                if duration is not None and due - start >= duration:
+                    break
+                await asyncio.sleep(max(0.0, due - time.monotonic()))
+            elif duration is not None and time.monotonic() - start >= duration:
+                break
+            await slots.acquire()
+            if _stopped():
+                break
+            if interval is None:
+                due = time.monotonic()
+            run = asyncio.ensure_future(_run_once(due))
+            in_flight.add(run)
+            run.add_done_callback(in_flight.discard)
+        await asyncio.gather(*in_flight)
+    finally:
+        for run in in_flight:
+            run.cancel()
+
+    if _stopped():
+        return first_failure
+    return Result.ok(RepeatSummary(outcomes['successes'], outcomes['failures'], time.monotonic() - start, latency))
@@ -0,0 +1,299 @@
+"""
+Low-latency process spawning for external tasks whose output is discarded.
+
+asyncio.create_subprocess_exec() goes through subprocess.Popen: it creates the pipes and an error-reporting pipe,
+closes every inherited file descriptor in the child, and copies the parent's page tables when it has to fork. For
+many short-lived tasks spawned from a large parent, this overhead dominates.
+
+A spawner is an alternative way for ExtTask to start its program, used when the output is not collected:
+
+- PosixSpawner calls os.posix_spawnp() directly (vfork + exec in the C library). There is no pipe at all: the
+  standard streams of the child are bound to a shared /dev/null descriptor. The exit is awaited with a pidfd
+  (Linux 5.3+) registered in the event loop, or with a blocking waitpid() in a worker thread elsewhere. The child is
+  reaped as soon as it exits, even if nobody waits for it.
+  posix_spawn() can not change directory, so it only applies to tasks without a cwd.
+- ForkServer starts a small helper process, ideally early while the parent is still small, which spawns the children
+  on behalf of the parent and reports their exit codes. It supports cwd.
+
+In both cases the child is the leader of a new session, so that process_tree.terminate_tree() applies as usual.
+
+Example:
+
+    spawner = PosixSpawner()
+    tasks = [ExtTask(f'touch {i}', ['touch', f'/tmp/{i}'], collect_output=False, spawner=spawner) for i in range(1000)]
+
+Benchmark: benchmarks/bench_spawn.py
+"""
+import asyncio
+import itertools
+import json
+import os
+import signal
+import sys
+import threading
+from typing import Optional
+
+# signals ignored by the Python runtime, which the children would inherit as ignored otherwise
+_RESTORED_SIGNALS = tuple(getattr(signal, name) for name in ('SIGPIPE', 'SIGXFSZ') if hasattr(signal, name))
+
+
+class SpawnError(Exception):
+    """Thrown when a spawner can not start a program."""
+
+
+class SpawnedProcess:
+    """
+    The minimal process interface used by ExtTask and process_tree.terminate_tree()
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.returncode: Optional[int] = None
+
+    async def wait(self) -> int:
+        raise NotImplementedError()
+
+    async def communicate(self) -> tuple[None, None]:
+        """
+        Same as asyncio.subprocess.Process.communicate() for a process without pipes.
+        """
+        await self.wait()
+        return None, None
+
+    def kill(self):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+class Spawner:
+    def supports(self, cwd: Optional[str]) -> bool:
+        """
+        Whether the spawner can start a program in the given working directory.
+        """
+        raise NotImplementedError()
+
+    async def spawn(self, command: list[str], cwd: Optional[str], env: Optional[dict]) -> SpawnedProcess:
+        raise NotImplementedError()
+
+
+def _spawn_detached(command: list[str], env: Optional[dict], devnull: int) -> int:
+    return os.posix_spawnp(
+        command[0],
+        command,
+        os.environ if env is None else env,
+        file_actions=[(os.POSIX_SPAWN_DUP2, devnull, fd) for fd in (0, 1, 2)],
+        setsid=True,
+        setsigdef=_RESTORED_SIGNALS,
+    )
+
+
+class _PosixSpawnedProcess(SpawnedProcess):
+    """
+    The child is reaped as soon as it exits, whether or not anyone waits for it, so that it does not linger as a
+    zombie keeping its process group alive (see process_tree.terminate_tree()).
+    """
+
+    def __init__(self, pid: int):
+        super().__init__(pid)
+        loop = asyncio.get_running_loop()
+        self._exited = loop.create_future()
+        try:
+            self._pidfd = os.pidfd_open(pid) if hasattr(os, 'pidfd_open') else None
+        except OSError:
+            self._pidfd = None
+        if self._pidfd is not None:
+            loop.add_reader(self._pidfd, self._reap)
+        else:
+            self._waiter = asyncio.ensure_future(asyncio.to_thread(os.waitpid, self.pid, 0))
+            self._waiter.add_done_callback(self._on_waited)
+
+    def _reap(self):
+        asyncio.get_running_loop().remove_reader(self._pidfd)
+        os.close(self._pidfd)
+        self._pidfd = None
+        _, status = os.waitpid(self.pid, 0)
+        self._set_returncode(status)
+
+    def _on_waited(self, waiter: asyncio.Future):
+        if not waiter.cancelled():
+            self._set_returncode(waiter.result()[1])
+
+    def _set_returncode(self, status: int):
+        self.returncode = os.waitstatus_to_exitcode(status)
+        if not self._exited.done():
+            self._exited.set_result(self.returncode)
+
+    async def wait(self) -> int:
+        # shielded, a cancelled wait must not lose the exit code for the next one
+        return await asyncio.shield(self._exited)
+
+
+class PosixSpawner(Spawner):
+    """
+    Spawn with os.posix_spawnp(), see the module documentation.
+    """
+
+    def __init__(self):
+        self._devnull: Optional[int] = None
+
+    def __getstate__(self) -> dict:
+        # the descriptor is meaningless in another process
+        return dict(_devnull=None)
+
+    def supports(self, cwd: Optional[str]) -> bool:
+        return hasattr(os, 'posix_spawnp') and cwd is None
+
+    async def spawn(self, command: list[str], cwd: Optional[str], env: Optional[dict]) -> SpawnedProcess:
+        if not self.supports(cwd):
+            raise SpawnError('posix_spawn is not available, or a cwd is given')
+        if self._devnull is None:
+            self._devnull = os.open(os.devnull, os.O_RDWR)
+        return _PosixSpawnedProcess(_spawn_detached(command, env, self._devnull))
+
+    def close(self):
+        if self._devnull is not None:
+            os.close(self._devnull)
+            self._devnull = None
+
+
+class _ForkServerProcess(SpawnedProcess):
+
+    def __init__(self, pid: int, exited: asyncio.Future):
+        super().__init__(pid)
+        self._exited = exited
+
+    async def wait(self) -> int:
+        # shielded, a cancelled wait must not lose the exit code for the next one
+        self.returncode = await asyncio.shield(self._exited)
+        return self.returncode
+
+
+class ForkServer(Spawner):
+    """
+    Spawn through a helper process, see the module documentation.
+
+    The helper talks JSON lines over its stdin and stdout:
+
+    - request: {"id": 1, "argv": [...], "cwd": null, "env": null}
+    - replies: {"id": 1, "pid": 1234} or {"id": 1, "error": "..."}, then {"id": 1, "returncode": 0} on exit
+    """
+
+    def __init__(self):
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._ids = itertools.count()
+        self._started: dict[int, asyncio.Future] = {}
+        self._exited: dict[int, asyncio.Future] = {}
+
+    async def __aenter__(self) -> 'ForkServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.stop()
+
+    def supports(self, cwd: Optional[str]) -> bool:
+        return hasattr(os, 'posix_spawnp')
+
+    async def start(self):
+        package_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (package_root, env.get('PYTHONPATH')) if p)
+        self._process = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'konstructcore.tasks.spawn',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env=env,
+        )
+        self._reader = asyncio.ensure_future(self._receive())
+
+    async def stop(self):
+        if self._process is None:
+            return
+        self._process.stdin.close()
+        await self._process.wait()
+        await asyncio.gather(self._reader, return_exceptions=True)
+        self._process = None
+
+    async def _receive(self):
+        try:
+            while line := await self._process.stdout.readline():
+                message = json.loads(line)
+                request_id = message['id']
+                if 'returncode' in message:
+                    future = self._exited.pop(request_id)
+                elif 'pid' in message:
+                    future = self._started.pop(request_id)
+                else:
+                    self._exited.pop(request_id, None)
+                    self._started.pop(request_id).set_exception(SpawnError(message['error']))
+                    continue
+                future.set_result(message.get('returncode', message.get('pid')))
+        finally:
+            for future in itertools.chain(self._started.values(), self._exited.values()):
+                if not future.done():
+                    future.set_exception(SpawnError('the fork server exited'))
+
+    async def spawn(self, command: list[str], cwd: Optional[str], env: Optional[dict]) -> SpawnedProcess:
+        if self._process is None:
+            raise SpawnError('the fork server is not started')
+        loop = asyncio.get_running_loop()
+        request_id = next(self._ids)
+        started = self._started[request_id] = loop.create_future()
+        exited = self._exited[request_id] = loop.create_future()
+        # the environment of the helper is frozen at start and carries its own PYTHONPATH, the children get the
+        # current environment of the parent instead, as with the other spawners
+        request = dict(id=request_id, argv=command, cwd=cwd, env=dict(os.environ) if env is None else env)
+        self._process.stdin.write(json.dumps(request).encode('utf-8') + b'\n')
+        await self._process.stdin.drain()
+        return _ForkServerProcess(await started, exited)
+
+
+def _serve():
+    """
+    The main loop of the fork server helper process.
+    """
+    lock = threading.Lock()
+    children = threading.Semaphore(0)
+    requests: dict[int, int] = {}
+    devnull = os.open(os.devnull, os.O_RDWR)
+    out = os.fdopen(os.dup(1), 'w')
+
+    def send(message: dict):
+        with lock:
+            out.write(json.dumps(message) + '\n')
+            out.flush()
+
+    def reap():
+        while True:
+            children.acquire()
+            pid, status = os.wait()
+            with lock:
+                request_id = requests.pop(pid)
+            send(dict(id=request_id, returncode=os.waitstatus_to_exitcode(status)))
+
+    threading.Thread(target=reap, daemon=True).start()
+    home = os.getcwd()
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            if request['cwd'] is not None:
+                os.chdir(request['cwd'])
+            # the lock makes sure the reaper knows the pid before it can report it
+            with lock:
+                pid = _spawn_detached(request['argv'], request['env'], devnull)
+                requests[pid] = request['id']
+        except Exception as err:
+            send(dict(id=request['id'], error=f'{type(err).__name__}: {err}'))
+            continue
+        finally:
+            os.chdir(home)
+        children.release()
+        send(dict(id=request['id'], pid=pid))
+
+
+if __name__ == '__main__':
+    _serve()
@@ -1,11 +1,37 @@
 """
 the abstract Task type
 """
-from typing import Callable
+import hashlib
+import json
+import pickle
+import uuid
+from typing import Callable, Any, Optional
 
 from konstructcore.datatypes.result import Result
 
 
+def digest(*parts: Any) -> str:
+    """
+    Return a stable hex digest of JSON-compatible values. Values which are not JSON-compatible are hashed by their
+    str() representation.
+    """
+    s = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(s.encode('utf-8')).hexdigest()
+
+
+def workload_digest(workload: Any) -> str:
+    """
+    Return a digest of the state of a workload (a function or a callable object), from its pickle.
+
+    A workload which can not be pickled gets a random digest, so that the task identities derived from it never match
+    another task.
+    """
+    try:
+        return hashlib.sha256(pickle.dumps(workload, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+    except Exception:
+        return f'unpicklable:{uuid.uuid4().hex}'
+
+
 class Task:
     async def run(self) -> Result:
         raise NotImplementedError()
@@ -16,6 +42,16 @@ class Task:
     def format(self) -> str:
         raise NotImplementedError()
 
+    def identity(self) -> Optional[str]:
+        """
+        Return a stable string identifying the work done by this task, such that two tasks with the same identity
+        are interchangeable, in this process or in a later one.
+
+        By default, a task has no stable identity and None is returned: the name of a task does not tell what it
+        does. Such a task is neither replayed from a journal nor de-duplicated.
+        """
+        return None
+
 
 class TaskFailure(Exception):
     """
@@ -33,6 +69,8 @@ class TaskFailure(Exception):
     Fail_Exception = 'Exception'
     Fail_With_Stderr = 'WithStderr'
     Cannot_Process_Output = 'CannotProcessOutput'
+    Fail_Cancelled = 'Cancelled'
+    Fail_Resource_Limit = 'ResourceLimit'
 
     def __init__(self, *args):
         super().__init__(*args)
@@ -69,3 +107,15 @@ class TaskFailure(Exception):
         ins = cls(f'Cannot process output of external task.\n{task.format()}\nError ==> {error}')
         ins.failure_type = TaskFailure.Cannot_Process_Output
         return ins
+
+    @classmethod
+    def cancelled(cls, task: 'Task') -> 'TaskFailure':
+        ins = cls(f'Task is cancelled.\n{task.format()}')
+        ins.failure_type = TaskFailure.Fail_Cancelled
+        return ins
+
+    @classmethod
+    def resource_limit(cls, task: 'Task', reason: str) -> 'TaskFailure':
+        ins = cls(f'External task exceeds its resource limits: {reason}.\n{task.format()}')
+        ins.failure_type = TaskFailure.Fail_Resource_Limit
+        return ins
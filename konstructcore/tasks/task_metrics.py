@@ -0,0 +1,68 @@
+"""
+metrics recorded automatically by the tasks, in the default metrics registry
+
+- konstruct_tasks_started_total{task_type}
+- konstruct_tasks_succeeded_total{task_type}
+- konstruct_tasks_failed_total{task_type, failure_type}
+- konstruct_task_retries_total{policy}
+- konstruct_task_duration_seconds{task_name}
+- konstruct_tasks_in_flight
+
+A run counts once, however many times it is retried, and a retry counts only when another attempt actually runs.
+Note, the duration histogram has one child per task name: give the tasks of a large batch a shared name if they do
+not need to be told apart.
+"""
+import asyncio
+import functools
+import time
+
+from konstructcore.metrics.registry import DEFAULT_REGISTRY
+from konstructcore.tasks.task import TaskFailure
+
+TASKS_STARTED = DEFAULT_REGISTRY.counter('konstruct_tasks_started_total', 'Tasks started.', ['task_type'])
+TASKS_SUCCEEDED = DEFAULT_REGISTRY.counter('konstruct_tasks_succeeded_total', 'Tasks succeeded.', ['task_type'])
+TASKS_FAILED = DEFAULT_REGISTRY.counter('konstruct_tasks_failed_total', 'Tasks failed, by failure type.',
+                                        ['task_type', 'failure_type'])
+TASK_RETRIES = DEFAULT_REGISTRY.counter('konstruct_task_retries_total', 'Task retries, by retry policy.', ['policy'])
+TASK_DURATION = DEFAULT_REGISTRY.histogram('konstruct_task_duration_seconds', 'Task duration, retries included.',
+                                           ['task_name'])
+TASKS_IN_FLIGHT = DEFAULT_REGISTRY.gauge('konstruct_tasks_in_flight', 'Tasks currently running.')
+
+
+def _failure_type(error: Exception) -> str:
+    return TaskFailure.unwrap_failure_type(error) or type(error).__name__
+
+
+def instrumented(run):
+    """
+    Decorate the run() or run_with() method of a task to record its metrics.
+    """
+
+    @functools.wraps(run)
+    async def wrapper(self, *args, **kwargs):
+        task_type = type(self).__name__
+        TASKS_STARTED.labels(task_type).inc()
+        TASKS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            result = await run(self, *args, **kwargs)
+        except asyncio.CancelledError:
+            TASKS_FAILED.labels(task_type, TaskFailure.Fail_Cancelled).inc()
+            raise
+        except BaseException as err:
+            TASKS_FAILED.labels(task_type, type(err).__name__).inc()
+            raise
+        finally:
+            TASKS_IN_FLIGHT.dec()
+            TASK_DURATION.labels(getattr(self, 'name', task_type)).observe(time.perf_counter() - start)
+        if result:
+            TASKS_SUCCEEDED.labels(task_type).inc()
+        elif result is not None:
+            TASKS_FAILED.labels(task_type, _failure_type(result.error)).inc()
+        return result
+
+    return wrapper
+
+
+def record_retry(policy):
+    TASK_RETRIES.labels(type(policy).__name__).inc()
@@ -0,0 +1,143 @@
+"""
+In-process tasks, for workloads which do not need a process of their own.
+
+A future-thread task runs its workload in a thread pool. It suits I/O-bound workloads and workloads which release the
+GIL (hashing, zlib, file I/O): they run in parallel without paying for a process start and pickling.
+
+An inline task runs its workload directly in the event loop. It suits tiny workloads, for which even a thread
+dispatch is overhead. It blocks the event loop while it runs.
+
+The workload has the same shape as the one of FutureProcessTask: it takes the environment table and returns a Result.
+As it shares the process with the caller, it must not modify os.environ; it should read the given table instead.
+
+All the task-level properties are inherited from the base Task class.
+"""
+
+import asyncio
+from concurrent.futures import Executor
+from typing import Optional, Callable
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.retry import RetryPolicy
+from konstructcore.tasks.task import Task, TaskFailure, digest, workload_digest
+from konstructcore.tasks.task_metrics import instrumented, record_retry
+
+
+class FutureThreadTask(Task):
+    """
+    Run the workload in a thread pool: the given executor, or the default executor of the event loop.
+
+    On timeout, the task fails with TaskFailure.Fail_Time_Out. The thread itself can not be interrupted, it finishes
+    the workload in the background and its Result is discarded.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            workload: Callable[[dict], Result],
+            env: Optional[dict] = None,
+            timeout: Optional[float] = None,
+            retry_policy: Optional[RetryPolicy] = None,
+            executor: Optional[Executor] = None,
+    ):
+        self.name = name
+        self.workload = workload
+        self.env = env
+        self.timeout = timeout
+        self.retry_policy = retry_policy
+        self.executor = executor
+
+    def format(self) -> str:
+        """
+        Return a nicely formatted representation of the task
+        """
+        return f"""Task [{self.name}] (
+    workload={self.workload!r},
+    timeout={self.timeout},
+    retry={self.retry_policy}
+)"""
+
+    def identity(self) -> str:
+        return digest('FutureThreadTask', workload_digest(self.workload), self.env)
+
+    async def _run(self) -> Result:
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self.executor, self.workload, self.env),
+                                          timeout=self.timeout)
+        except asyncio.TimeoutError:
+            return Result.err(TaskFailure.from_task(self, True))
+        except Exception as err:
+            return Result.err(TaskFailure.from_task_and_error(self, err))
+
+    @instrumented
+    async def run(self) -> Result:
+        last_result = None
+        attempts = self.retry_policy.num_retries() if self.retry_policy else 1
+        for attempt in range(attempts):
+            if result := await self._run():
+                return result
+            else:
+                last_result = result
+                if self.retry_policy and not self.retry_policy.retryable(result.error):
+                    break
+                if self.retry_policy and self.retry_policy.should_retry():
+                    if attempt + 1 < attempts:
+                        record_retry(self.retry_policy)
+                    await self.retry_policy.prepare_retry(self)
+        return last_result
+
+
+class InlineTask(Task):
+    """
+    Run the workload directly in the event loop.
+
+    There is no timeout: the event loop is blocked until the workload returns.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            workload: Callable[[dict], Result],
+            env: Optional[dict] = None,
+            retry_policy: Optional[RetryPolicy] = None,
+    ):
+        self.name = name
+        self.workload = workload
+        self.env = env
+        self.retry_policy = retry_policy
+
+    def format(self) -> str:
+        """
+        Return a nicely formatted representation of the task
+        """
+        return f"""Task [{self.name}] (
+    workload={self.workload!r},
+    retry={self.retry_policy}
+)"""
+
+    def identity(self) -> str:
+        return digest('InlineTask', workload_digest(self.workload), self.env)
+
+    def _run(self) -> Result:
+        try:
+            return self.workload(self.env)
+        except Exception as err:
+            return Result.err(TaskFailure.from_task_and_error(self, err))
+
+    @instrumented
+    async def run(self) -> Result:
+        last_result = None
+        attempts = self.retry_policy.num_retries() if self.retry_policy else 1
+        for attempt in range(attempts):
+            if result := self._run():
+                return result
+            else:
+                last_result = result
+                if self.retry_policy and not self.retry_policy.retryable(result.error):
+                    break
+                if self.retry_policy and self.retry_policy.should_retry():
+                    if attempt + 1 < attempts:
+                        record_retry(self.retry_policy)
+                    await self.retry_policy.prepare_retry(self)
+        return last_result
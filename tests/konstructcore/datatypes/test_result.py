@@ -0,0 +1,38 @@
+"""
+test the Result datatype
+"""
+import pickle
+
+import pytest
+
+from konstructcore.datatypes.result import Result
+
+
+def test_compact_representation():
+    assert not hasattr(Result.ok(1), '__dict__')
+    assert Result.ok(None) is Result.ok(None)
+    assert Result.ok(0) is not Result.ok(0)
+    restored = pickle.loads(pickle.dumps(Result.ok([1, 2])))
+    assert restored.value == [1, 2]
+    assert pickle.loads(pickle.dumps(Result.ok(None))).is_ok()
+
+
+def test_monadic_helpers():
+    error = ValueError('bad')
+    failed = Result.err(error)
+    assert Result.ok(2).map(lambda x: x * 3).value == 6
+    assert failed.map(lambda x: x * 3) is failed
+    assert Result.ok(2).and_then(lambda x: Result.err(error)).error is error
+    assert failed.and_then(lambda x: Result.ok(x)) is failed
+    assert Result.ok(2).unwrap_or(0) == 2
+    assert failed.unwrap_or(0) == 0
+    assert Result.ok(2).unwrap() == 2
+    with pytest.raises(ValueError):
+        failed.unwrap()
+
+
+def test_collect():
+    assert Result.collect([Result.ok(1), Result.ok(None), Result.ok(3)]).value == [1, None, 3]
+    failed = Result.err(ValueError('bad'))
+    assert Result.collect([Result.ok(1), failed, Result.err(KeyError())]) is failed
+    assert Result.collect([]).value == []
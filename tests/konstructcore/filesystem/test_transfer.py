@@ -0,0 +1,102 @@
+"""
+test bulk copy and sync
+"""
+import os
+
+import pytest
+
+from konstructcore.filesystem.transfer import copy_file, sync_tree, is_identical, FileCopyError
+
+
+def _write(path, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fp:
+        fp.write(data)
+
+
+@pytest.mark.asyncio
+async def test_copy_file(tmp_path):
+    src = str(tmp_path / 'src.bin')
+    dst = str(tmp_path / 'out' / 'dst.bin')
+    _write(src, os.urandom(3 * 1024 * 1024 + 7))
+    result = await copy_file(src, dst)
+    assert result.is_ok()
+    assert result.value.files_copied == 1
+    assert result.value.bytes_copied == os.path.getsize(src)
+    with open(src, 'rb') as a, open(dst, 'rb') as b:
+        assert a.read() == b.read()
+    assert is_identical(src, dst)
+
+    # the second copy is skipped
+    result = await copy_file(src, dst)
+    assert result.is_ok()
+    assert result.value.files_skipped == 1
+    assert result.value.bytes_copied == 0
+
+
+@pytest.mark.asyncio
+async def test_copy_missing_file(tmp_path):
+    result = await copy_file(str(tmp_path / 'missing'), str(tmp_path / 'dst'))
+    assert result.is_err()
+    assert isinstance(result.error, FileCopyError)
+    assert not os.listdir(tmp_path)
+
+
+@pytest.mark.asyncio
+async def test_sync_tree(tmp_path):
+    src_dir = tmp_path / 'src'
+    dst_dir = tmp_path / 'dst'
+    for i in range(10):
+        _write(str(src_dir / f'd{i % 3}' / f'f{i}.dat'), os.urandom(1000 + i))
+    _write(str(src_dir / 'empty.dat'), b'')
+
+    result = await sync_tree(str(src_dir), str(dst_dir), concurrency=4)
+    assert result.is_ok()
+    assert result.value.files_copied == 11
+    assert result.value.bytes_per_second() >= 0
+    for i in range(10):
+        assert is_identical(str(src_dir / f'd{i % 3}' / f'f{i}.dat'), str(dst_dir / f'd{i % 3}' / f'f{i}.dat'))
+
+    _write(str(src_dir / 'd0' / 'f0.dat'), b'changed')
+    result = await sync_tree(str(src_dir), str(dst_dir), concurrency=4)
+    assert result.is_ok()
+    assert result.value.files_copied == 1
+    assert result.value.files_skipped == 10
+    assert (dst_dir / 'd0' / 'f0.dat').read_bytes() == b'changed'
+
+
+@pytest.mark.asyncio
+async def test_sync_missing_dir(tmp_path):
+    result = await sync_tree(str(tmp_path / 'nope'), str(tmp_path / 'dst'))
+    assert result.is_err()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason='requires procfs')
+async def test_copy_file_without_reported_size(tmp_path):
+    # procfs reports a size of 0, and nothing to copy_file_range()
+    src = '/proc/self/mountinfo'
+    dst = str(tmp_path / 'mountinfo')
+    result = await copy_file(src, dst)
+    assert result.is_ok()
+    with open(dst, 'rb') as fp:
+        data = fp.read()
+    assert data
+    assert result.value.bytes_copied == len(data)
+
+
+@pytest.mark.asyncio
+async def test_copy_falls_back_when_fast_paths_copy_nothing(tmp_path, monkeypatch):
+    if hasattr(os, 'copy_file_range'):
+        monkeypatch.setattr(os, 'copy_file_range', lambda *args: 0)
+    if hasattr(os, 'sendfile'):
+        monkeypatch.setattr(os, 'sendfile', lambda *args: 0)
+    src = str(tmp_path / 'src.bin')
+    dst = str(tmp_path / 'dst.bin')
+    data = os.urandom(1024 * 1024 + 3)
+    _write(src, data)
+    result = await copy_file(src, dst)
+    assert result.is_ok()
+    assert result.value.bytes_copied == len(data)
+    with open(dst, 'rb') as fp:
+        assert fp.read() == data
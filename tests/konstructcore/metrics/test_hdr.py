@@ -0,0 +1,32 @@
+"""
+test the HDR latency histogram
+"""
+import pytest
+
+from konstructcore.metrics.hdr import HdrHistogram
+
+
+def test_percentiles_within_one_percent():
+    histogram = HdrHistogram()
+    for i in range(1, 10001):
+        histogram.record(i / 1000)
+    assert histogram.count == 10000
+    assert histogram.min == pytest.approx(0.001)
+    assert histogram.max == pytest.approx(10.0)
+    assert histogram.mean() == pytest.approx(5.0005)
+    for p, expected in ((50, 5.0), (95, 9.5), (99, 9.9), (100, 10.0)):
+        assert histogram.percentile(p) == pytest.approx(expected, rel=0.01)
+
+
+def test_merge_and_empty():
+    first, second = HdrHistogram(), HdrHistogram()
+    assert first.percentile(99) == 0.0
+    assert first.format() == 'no samples'
+    first.record(0.002)
+    second.record(0.5)
+    first.merge(second)
+    assert first.count == 2
+    assert first.percentile(50) == pytest.approx(0.002, rel=0.01)
+    assert first.percentile(99) == pytest.approx(0.5, rel=0.01)
+    with pytest.raises(ValueError):
+        first.merge(HdrHistogram(unit=1e-3))
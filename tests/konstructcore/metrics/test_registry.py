@@ -0,0 +1,107 @@
+"""
+test the metrics registry and its exporters
+"""
+import asyncio
+
+import pytest
+
+from konstructcore.metrics.registry import Registry, DEFAULT_REGISTRY, write_textfile, serve_http
+from konstructcore.tasks.ext_task import ExtTask
+from konstructcore.tasks.retry import RetryWithConstantSleep
+from konstructcore.tasks.runners import run_all
+from konstructcore.tasks.task import TaskFailure
+from tests.konstructcore.tasks.helpers import CommandHelper
+
+
+def test_prometheus_text():
+    registry = Registry()
+    counter = registry.counter('jobs_total', 'Jobs.', ['kind'])
+    counter.labels('a').inc()
+    counter.labels('a').inc(2)
+    counter.labels('b"x').inc()
+    assert registry.counter('jobs_total', 'Jobs.', ['kind']) is counter
+    gauge = registry.gauge('in_flight', 'In flight.')
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    histogram = registry.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value)
+
+    text = registry.to_prometheus_text()
+    assert '# TYPE jobs_total counter' in text
+    assert 'jobs_total{kind="a"} 3' in text
+    assert 'jobs_total{kind="b\\"x"} 1' in text
+    assert 'in_flight 1' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 3' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+    assert 'latency_seconds_count 4' in text
+    assert 'latency_seconds_sum 6.05' in text
+
+    with pytest.raises(ValueError):
+        registry.gauge('jobs_total', 'Jobs.')
+    with pytest.raises(ValueError):
+        counter.labels('a', 'b')
+
+
+def test_write_textfile(tmp_path):
+    registry = Registry()
+    registry.counter('x_total', 'X.').inc()
+    path = str(tmp_path / 'metrics.prom')
+    write_textfile(path, registry)
+    with open(path) as fp:
+        assert 'x_total 1' in fp.read()
+
+
+@pytest.mark.asyncio
+async def test_serve_http():
+    registry = Registry()
+    registry.counter('x_total', 'X.').inc()
+    server = await serve_http(port=0, registry=registry)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        response = (await reader.read()).decode()
+        writer.close()
+        assert response.startswith('HTTP/1.1 200 OK')
+        assert 'x_total 1' in response
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def test_special_values():
+    registry = Registry()
+    gauge = registry.gauge('ratio', 'Ratio.', ['kind'])
+    gauge.labels('nan').set(float('nan'))
+    gauge.labels('inf').set(float('-inf'))
+    text = registry.to_prometheus_text()
+    assert 'ratio{kind="nan"} NaN' in text
+    assert 'ratio{kind="inf"} -Inf' in text
+
+
+def _value(name: str, *labels: str) -> float:
+    return DEFAULT_REGISTRY.get(name).labels(*labels).value
+
+
+@pytest.mark.asyncio
+async def test_tasks_record_metrics():
+    started = _value('konstruct_tasks_started_total', 'ExtTask')
+    succeeded = _value('konstruct_tasks_succeeded_total', 'ExtTask')
+    failed = _value('konstruct_tasks_failed_total', 'ExtTask', TaskFailure.Fail_With_Stderr)
+    retries = _value('konstruct_task_retries_total', 'RetryWithConstantSleep')
+
+    await run_all([
+        ExtTask(name='metrics echo', command=CommandHelper.get_echo_command()),
+        ExtTask(name='metrics fail', command=CommandHelper.get_failing_command(),
+                retry_policy=RetryWithConstantSleep(sleep_sec=0.01, retries=2)),
+    ])
+    assert _value('konstruct_tasks_started_total', 'ExtTask') == started + 2
+    assert _value('konstruct_tasks_succeeded_total', 'ExtTask') == succeeded + 1
+    assert _value('konstruct_tasks_failed_total', 'ExtTask', TaskFailure.Fail_With_Stderr) == failed + 1
+    # 2 attempts, so 1 retry
+    assert _value('konstruct_task_retries_total', 'RetryWithConstantSleep') == retries + 1
+    assert DEFAULT_REGISTRY.get('konstruct_tasks_in_flight').labels().value == 0
+    assert DEFAULT_REGISTRY.get('konstruct_task_duration_seconds').labels('metrics echo').count == 1
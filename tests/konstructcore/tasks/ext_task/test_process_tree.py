@@ -0,0 +1,64 @@
+"""
+test that timeout and cancellation terminate the whole process tree
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+from konstructcore.tasks.ext_task import ExtTask
+from konstructcore.tasks.task import TaskFailure
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='requires a POSIX shell')
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    try:
+        with open(f'/proc/{pid}/stat') as fp:
+            # a zombie is dead, it is only waiting for its parent to reap it
+            return fp.read().split(')')[-1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return True
+
+
+def _spawn_grandchild_command(pid_file) -> list[str]:
+    return ['sh', '-c', f'sleep 30 & echo $! > {pid_file}; wait']
+
+
+async def _read_pid(pid_file) -> int:
+    for _ in range(100):
+        if pid_file.exists() and pid_file.read_text().strip():
+            return int(pid_file.read_text())
+        await asyncio.sleep(0.02)
+    raise AssertionError('the grandchild was not started')
+
+
+@pytest.mark.asyncio
+async def test_timeout_kills_grandchildren(tmp_path):
+    pid_file = tmp_path / 'pid'
+    task = ExtTask(name='wrapper', command=_spawn_grandchild_command(pid_file), timeout=0.5, kill_grace_period=1)
+    result = await task.run()
+    assert result.is_err()
+    assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Time_Out
+    grandchild = await _read_pid(pid_file)
+    await asyncio.sleep(0.1)
+    assert not _is_alive(grandchild)
+
+
+@pytest.mark.asyncio
+async def test_cancel_kills_grandchildren(tmp_path):
+    pid_file = tmp_path / 'pid'
+    task = ExtTask(name='wrapper', command=_spawn_grandchild_command(pid_file), kill_grace_period=1)
+    running = asyncio.ensure_future(task.run())
+    grandchild = await _read_pid(pid_file)
+    assert _is_alive(grandchild)
+    running.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await running
+    await asyncio.sleep(0.1)
+    assert not _is_alive(grandchild)
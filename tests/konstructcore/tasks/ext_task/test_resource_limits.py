@@ -0,0 +1,83 @@
+"""
+test the resource limits of external tasks
+"""
+import signal
+import sys
+
+import pytest
+
+from konstructcore.tasks.ext_task import ExtTask
+from konstructcore.tasks.limits import ResourceLimits
+from konstructcore.tasks.pipeline import ExtPipeline
+from konstructcore.tasks.retry import RetryWithConstantSleep
+from konstructcore.tasks.task import TaskFailure
+
+pytestmark = pytest.mark.skipif(not ResourceLimits.supported(), reason='resource limits need the resource module')
+
+
+@pytest.mark.asyncio
+async def test_cpu_limit():
+    task = ExtTask(name="busy task",
+                   command=[sys.executable, '-c', 'while True: pass'],
+                   timeout=10,
+                   resource_limits=ResourceLimits(cpu_sec=1))
+    result = await task.run()
+    assert result.is_err()
+    assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Resource_Limit
+
+
+@pytest.mark.asyncio
+async def test_memory_limit_is_not_retried():
+    policy = RetryWithConstantSleep(0.1, 3, no_retry_on=[TaskFailure.Fail_Resource_Limit])
+    task = ExtTask(name="greedy task",
+                   command=[sys.executable, '-c', 'x = bytearray(1024 ** 3)'],
+                   retry_policy=policy,
+                   resource_limits=ResourceLimits(address_space_bytes=512 * 1024 ** 2))
+    result = await task.run()
+    assert result.is_err()
+    assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Resource_Limit
+    assert policy.num_failures() == 0
+
+
+@pytest.mark.asyncio
+async def test_within_limits():
+    task = ExtTask(name="small task",
+                   command=[sys.executable, '-c', 'print("ok")'],
+                   resource_limits=ResourceLimits(address_space_bytes=1024 ** 3, cpu_sec=10, open_files=64))
+    result = await task.run()
+    assert result.is_ok()
+    assert result.value.stdout.strip() == 'ok'
+
+
+def test_violation_from_return_code():
+    limits = ResourceLimits(cpu_sec=5)
+    assert limits.violation(-signal.SIGXCPU, '') is not None
+    assert limits.violation(128 + signal.SIGXCPU, '') is not None
+    assert limits.violation(1, 'MemoryError') is None
+    assert ResourceLimits(open_files=8).violation(1, 'OSError: [Errno 24] Too many open files') is not None
+
+
+@pytest.mark.asyncio
+async def test_memory_limit_without_output():
+    policy = RetryWithConstantSleep(0.1, 3, no_retry_on=[TaskFailure.Fail_Resource_Limit])
+    task = ExtTask(name="greedy task",
+                   command=[sys.executable, '-c', 'x = bytearray(1024 ** 3)'],
+                   retry_policy=policy,
+                   collect_output=False,
+                   resource_limits=ResourceLimits(address_space_bytes=512 * 1024 ** 2))
+    result = await task.run()
+    assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Resource_Limit
+    assert policy.num_failures() == 0
+    result = await task.run_with(None)
+    assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Resource_Limit
+
+
+@pytest.mark.asyncio
+async def test_pipeline_stage_limits():
+    greedy = ExtTask(name="greedy stage",
+                     command=[sys.executable, '-c', 'x = bytearray(1024 ** 3)'],
+                     resource_limits=ResourceLimits(address_space_bytes=512 * 1024 ** 2))
+    pipeline = ExtPipeline('limited', stages=[greedy, ExtTask('count', ['wc', '-c'])])
+    result = await pipeline.run()
+    assert result.is_err()
+    assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Resource_Limit
@@ -0,0 +1,118 @@
+"""
+test the low-latency spawners
+"""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+from konstructcore.tasks.ext_task import ExtTask
+from konstructcore.tasks.runners import run_all
+from konstructcore.tasks.spawn import PosixSpawner, ForkServer
+from konstructcore.tasks.task import TaskFailure
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='requires posix_spawn')
+
+
+async def _check_spawner(spawner, tmp_path):
+    marker = tmp_path / 'marker'
+    task = ExtTask(name='touch', command=['touch', str(marker)], collect_output=False, spawner=spawner)
+    result = await task.run()
+    assert result.is_ok()
+    assert result.value is None
+    assert marker.exists()
+
+    result = await ExtTask(name='fail', command=['false'], collect_output=False, spawner=spawner).run()
+    assert result.is_err()
+    assert result.error.return_code == 1
+
+    start = time.perf_counter()
+    result = await ExtTask(name='sleep', command=['sleep', '5'], collect_output=False, spawner=spawner,
+                           timeout=0.2, kill_grace_period=3).run()
+    assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Time_Out
+    # the group is gone as soon as the leader dies, without waiting for the grace period
+    assert time.perf_counter() - start < 1.5
+
+    results = await run_all([ExtTask(name=f'true {i}', command=['true'], collect_output=False, spawner=spawner)
+                             for i in range(20)])
+    assert all(r.is_ok() for r in results)
+
+
+@pytest.mark.asyncio
+async def test_posix_spawner(tmp_path):
+    spawner = PosixSpawner()
+    try:
+        await _check_spawner(spawner, tmp_path)
+        # a missing program is reported as a failure
+        result = await ExtTask(name='missing', command=['no-such-program-xyz'], collect_output=False,
+                               spawner=spawner).run()
+        assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Exception
+    finally:
+        spawner.close()
+
+
+@pytest.mark.asyncio
+async def test_fork_server(tmp_path):
+    async with ForkServer() as spawner:
+        await _check_spawner(spawner, tmp_path)
+        task = ExtTask(name='cwd', command=['touch', 'in_cwd'], cwd=str(tmp_path), collect_output=False,
+                       spawner=spawner)
+        assert (await task.run()).is_ok()
+        assert (tmp_path / 'in_cwd').exists()
+
+
+@pytest.mark.asyncio
+async def test_fork_server_children_inherit_the_parent_environment(tmp_path, monkeypatch):
+    async with ForkServer() as spawner:
+        monkeypatch.setenv('KONSTRUCT_SPAWN_MARK', 'set after start')
+        out = tmp_path / 'env'
+        command = ['sh', '-c', f'printf "%s|%s" "$PYTHONPATH" "$KONSTRUCT_SPAWN_MARK" > {out}']
+        task = ExtTask(name='env', command=command, collect_output=False, spawner=spawner)
+        assert (await task.run()).is_ok()
+        assert out.read_text() == f"{os.environ.get('PYTHONPATH', '')}|set after start"
+
+
+@pytest.mark.asyncio
+async def test_spawner_is_skipped_when_collecting_output():
+    task = ExtTask(name='echo', command=['echo', 'hello'], spawner=PosixSpawner())
+    result = await task.run()
+    assert result.value.stdout == 'hello\n'
+
+
+class RecordingSpawner(PosixSpawner):
+    def __init__(self):
+        super().__init__()
+        self.pids = []
+
+    async def spawn(self, command, cwd, env):
+        process = await super().spawn(command, cwd, env)
+        self.pids.append(process.pid)
+        return process
+
+
+def _is_zombie(pid: int) -> bool:
+    try:
+        with open(f'/proc/{pid}/stat') as fp:
+            return fp.read().rsplit(')', 1)[1].split()[0] == 'Z'
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/stat'), reason='requires procfs')
+@pytest.mark.asyncio
+async def test_cancelled_child_is_reaped():
+    spawner = RecordingSpawner()
+    try:
+        task = ExtTask(name='sleep', command=['sleep', '5'], collect_output=False, spawner=spawner,
+                       kill_grace_period=3)
+        running = asyncio.ensure_future(task.run())
+        await asyncio.sleep(0.2)
+        start = time.perf_counter()
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+        assert time.perf_counter() - start < 1.5
+        assert not _is_zombie(spawner.pids[0])
+    finally:
+        spawner.close()
@@ -0,0 +1,110 @@
+"""
+test the concurrency limiters
+"""
+import asyncio
+
+import pytest
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.concurrency import AdaptiveLimiter, FixedLimiter
+from konstructcore.tasks.runners import run_all
+from konstructcore.tasks.task import Task, TaskFailure
+
+
+class Probe(Task):
+    """
+    A task whose latency grows with the number of probes running at the same time, above a capacity
+    """
+    running = 0
+    peak = 0
+
+    def __init__(self, capacity: int = 1000, fail: bool = False, timeout: bool = False):
+        self.name = 'probe'
+        self.capacity = capacity
+        self.fail = fail
+        self.timeout = timeout
+
+    async def run(self) -> Result:
+        Probe.running += 1
+        Probe.peak = max(Probe.peak, Probe.running)
+        try:
+            await asyncio.sleep(0.01 * max(1.0, Probe.running / self.capacity))
+        finally:
+            Probe.running -= 1
+        if self.timeout:
+            return Result.err(TaskFailure.from_task(self, True))
+        return Result.err(ValueError('fail')) if self.fail else Result.ok(None)
+
+    def format(self) -> str:
+        return 'probe'
+
+
+@pytest.fixture(autouse=True)
+def reset_probe():
+    Probe.running = Probe.peak = 0
+
+
+@pytest.mark.asyncio
+async def test_fixed_limit():
+    results = await run_all([Probe() for _ in range(50)], concurrency=5)
+    assert all(r.is_ok() for r in results)
+    assert Probe.peak == 5
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limit_increases_when_uncongested():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=16)
+    await run_all([Probe() for _ in range(300)], concurrency=limiter)
+    assert limiter.limit > 4
+    assert Probe.peak <= 16
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limit_stays_near_capacity():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=64, latency_tolerance=1.5)
+    await run_all([Probe(capacity=4) for _ in range(600)], concurrency=limiter)
+    assert limiter.limit <= 12
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limit_ignores_ordinary_failures():
+    limiter = AdaptiveLimiter(min_limit=2, max_limit=64, initial_limit=8)
+    await run_all([Probe(fail=True) for _ in range(300)], concurrency=limiter)
+    assert limiter.limit > 8
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limit_decreases_on_timeouts():
+    limiter = AdaptiveLimiter(min_limit=2, max_limit=64, initial_limit=32, back_off_on_timeouts=True)
+    await run_all([Probe(timeout=True) for _ in range(200)], concurrency=limiter)
+    assert limiter.limit == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiters_release_their_slot():
+    limiter = FixedLimiter(1)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    limiter.release()
+    assert limiter.in_flight == 0
+    await asyncio.wait_for(limiter.acquire(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_waiter_cancelled_before_release():
+    limiter = FixedLimiter(1)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    # the release drops the cancelled waiter from the queue before it resumes
+    limiter.release()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.in_flight == 0
+    await asyncio.wait_for(limiter.acquire(), timeout=1)
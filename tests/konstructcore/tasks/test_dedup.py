@@ -0,0 +1,78 @@
+"""
+test the single-flight de-duplication of tasks
+"""
+import asyncio
+
+import pytest
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.dedup import SingleFlight
+from konstructcore.tasks.ext_task import ExtTask
+from konstructcore.tasks.runners import run_all
+from konstructcore.tasks.task import Task
+from tests.konstructcore.tasks.helpers import CommandHelper
+
+
+@pytest.mark.asyncio
+async def test_identical_tasks_share_one_execution():
+    tasks = [ExtTask(name=f"sleep task {i}", command=CommandHelper.get_sleep_command(0.5)) for i in range(5)]
+    tasks.append(ExtTask(name="echo task", command=CommandHelper.get_echo_command()))
+    flight = SingleFlight()
+    results = await run_all(tasks, dedup=flight)
+    assert all(r.is_ok() for r in results)
+    assert flight.executions == 2
+    assert flight.shared == 4
+    assert all(r is results[0] for r in results[:5])
+    assert flight.in_flight() == 0
+
+    # nothing is cached once the execution completes
+    await flight.run(tasks[0])
+    assert flight.executions == 3
+
+
+@pytest.mark.asyncio
+async def test_execution_survives_until_last_caller_is_cancelled():
+    runs = []
+
+    async def work() -> Result:
+        runs.append(1)
+        await asyncio.sleep(0.2)
+        return Result.ok(len(runs))
+
+    flight = SingleFlight()
+    first = asyncio.ensure_future(flight.do('key', work))
+    second = asyncio.ensure_future(flight.do('key', work))
+    await asyncio.sleep(0.05)
+    first.cancel()
+    assert (await second).value == 1
+
+    third = asyncio.ensure_future(flight.do('key', work))
+    await asyncio.sleep(0.05)
+    third.cancel()
+    await asyncio.gather(third, return_exceptions=True)
+    assert flight.in_flight() == 0
+    assert (await flight.do('key', work)).value == 3
+
+
+class Sleeper(Task):
+    """
+    a task without a stable identity
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    async def run(self) -> Result:
+        await asyncio.sleep(0.1)
+        return Result.ok(id(self))
+
+
+@pytest.mark.asyncio
+async def test_tasks_without_identity_are_not_shared():
+    tasks = [Sleeper('sleep') for _ in range(3)]
+    flight = SingleFlight()
+    results = await run_all(tasks, dedup=flight)
+    assert [r.value for r in results] == [id(t) for t in tasks]
+    assert (await flight.run(tasks[0])).value == id(tasks[0])
+    assert flight.executions == 0
+    assert flight.in_flight() == 0
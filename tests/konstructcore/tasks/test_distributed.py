@@ -0,0 +1,116 @@
+"""
+test dispatching tasks to worker agents on localhost
+"""
+import asyncio
+import sys
+
+import pytest
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.distributed import WorkerAgent, Dispatcher, RemoteTask, DispatchError, is_loopback, main
+from konstructcore.tasks.ext_task import ExtTask
+from konstructcore.tasks.mp_task import FutureProcessTask
+from konstructcore.tasks.runners import run_all
+from tests.konstructcore.tasks.helpers import CommandHelper
+
+
+class Square:
+    def __init__(self, n: int):
+        self.n = n
+
+    def __call__(self, env_: dict) -> Result:
+        return Result.ok(self.n * self.n)
+
+
+async def _start_agents(*names: str, **kwargs) -> list[WorkerAgent]:
+    agents = [WorkerAgent(port=0, name=name, tags=[f'tag-{name}'], capacity=2, heartbeat_interval=0.1, **kwargs)
+              for name in names]
+    for agent in agents:
+        await agent.start()
+    return agents
+
+
+@pytest.mark.asyncio
+async def test_run_remote_tasks():
+    agents = await _start_agents('a', 'b')
+    try:
+        async with Dispatcher([agent.address for agent in agents], heartbeat_timeout=1.0) as dispatcher:
+            tasks = [RemoteTask(ExtTask(name=f'echo {i}', command=CommandHelper.get_echo_command()), dispatcher)
+                     for i in range(6)]
+            tasks.append(RemoteTask(FutureProcessTask('square', workload=Square(7)), dispatcher))
+            results = await run_all(tasks)
+            assert all(r.is_ok() for r in results)
+            assert 'hello' in results[0].value.stdout
+            assert results[-1].value == 49
+
+            failing = RemoteTask(ExtTask(name='fail', command=CommandHelper.get_failing_command()), dispatcher)
+            result = await failing.run()
+            assert result.is_err()
+            assert result.error.return_code != 0
+    finally:
+        for agent in agents:
+            await agent.stop()
+
+
+@pytest.mark.asyncio
+async def test_locality_hint():
+    agents = await _start_agents('a', 'b')
+    try:
+        async with Dispatcher([agent.address for agent in agents]) as dispatcher:
+            hinted = [RemoteTask(ExtTask(name='sleep', command=CommandHelper.get_sleep_command(0.5)), dispatcher,
+                                 locality='tag-b') for _ in range(2)]
+            running = asyncio.ensure_future(run_all(hinted))
+            await asyncio.sleep(0.2)
+            loads = {w.name: len(w.pending) for w in dispatcher.workers}
+            assert loads == {'a': 0, 'b': 2}
+            assert all(r.is_ok() for r in await running)
+    finally:
+        for agent in agents:
+            await agent.stop()
+
+
+@pytest.mark.asyncio
+async def test_redispatch_when_worker_is_lost():
+    agents = await _start_agents('a', 'b')
+    try:
+        async with Dispatcher([agent.address for agent in agents], heartbeat_timeout=1.0) as dispatcher:
+            task = RemoteTask(ExtTask(name='sleep', command=CommandHelper.get_sleep_command(1)), dispatcher,
+                              locality='a')
+            running = asyncio.ensure_future(task.run())
+            await asyncio.sleep(0.3)
+            await agents[0].stop()
+            result = await running
+            assert result.is_ok()
+            assert [w.name for w in dispatcher.alive_workers()] == ['b']
+    finally:
+        for agent in agents:
+            await agent.stop()
+
+
+@pytest.mark.asyncio
+async def test_secret_mismatch():
+    agents = await _start_agents('a', secret=b'right')
+    try:
+        dispatcher = Dispatcher([agents[0].address], connect_timeout=1.0, secret=b'wrong')
+        result = await dispatcher.start()
+        assert result.is_err()
+        assert isinstance(result.error, DispatchError)
+    finally:
+        for agent in agents:
+            await agent.stop()
+
+
+def test_command_line_requires_a_secret_beyond_loopback(monkeypatch):
+    assert is_loopback('127.0.0.1') and is_loopback('::1') and is_loopback('localhost')
+    assert not is_loopback('0.0.0.0') and not is_loopback('') and not is_loopback('build-01')
+    monkeypatch.setattr(sys, 'argv', ['distributed', '--host', '0.0.0.0'])
+    with pytest.raises(SystemExit):
+        main()
+
+
+@pytest.mark.asyncio
+async def test_agent_warns_without_secret(caplog):
+    agent = WorkerAgent(host='0.0.0.0', port=0)
+    await agent.start()
+    await agent.stop()
+    assert 'without a secret' in caplog.text
@@ -0,0 +1,130 @@
+"""
+test the hedged execution of straggler tasks
+"""
+import asyncio
+import sys
+import time
+
+import pytest
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.ext_task import ExtTask
+from konstructcore.tasks import hedge
+from konstructcore.tasks.hedge import HedgePolicy, run_hedged
+from konstructcore.tasks.pipeline import ExtPipeline
+from konstructcore.tasks.retry import ExponentialBackoffRetry
+from konstructcore.tasks.runners import run_all
+from konstructcore.tasks.task import Task
+from tests.konstructcore.tasks.helpers import CommandHelper
+
+
+class SlowFirstTask(Task):
+    """
+    The first attempt is a straggler, the next ones are fast.
+    """
+
+    def __init__(self, name: str, attempts: list):
+        self.name = name
+        self.attempts = attempts
+
+    def format(self) -> str:
+        return self.name
+
+    async def run(self) -> Result:
+        self.attempts.append(self.name)
+        await asyncio.sleep(5 if self.attempts.count(self.name) == 1 else 0.05)
+        return Result.ok(self.name)
+
+
+@pytest.mark.asyncio
+async def test_hedge_beats_straggler():
+    policy = HedgePolicy(threshold_sec=0.2)
+    attempts = []
+    start = time.perf_counter()
+    result = await run_hedged(SlowFirstTask('straggler', attempts), policy)
+    assert time.perf_counter() - start < 1
+    assert result.value == 'straggler'
+    assert len(attempts) == 2
+    assert policy.stats() == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_hedge_on_percentile_of_peers():
+    policy = HedgePolicy(percentile=50, min_samples=3)
+    tasks = [ExtTask(name=f"echo task {i}", command=CommandHelper.get_echo_command()) for i in range(3)]
+    results = await run_all(tasks, hedge=policy)
+    assert all(r.is_ok() for r in results)
+    assert policy.stats() == (0, 0)
+    assert policy.delay() is not None
+
+    start = time.perf_counter()
+    result = await run_hedged(SlowFirstTask('straggler', []), policy)
+    assert result.is_ok()
+    assert time.perf_counter() - start < 1
+    assert policy.stats() == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_original_wins_when_faster():
+    policy = HedgePolicy(threshold_sec=0.1)
+    task = ExtTask(name="sleep task", command=CommandHelper.get_sleep_command(0.5))
+    result = await run_hedged(task, policy)
+    assert result.is_ok()
+    assert policy.launched == 1
+    assert policy.won == 0
+
+
+@pytest.mark.asyncio
+async def test_hedge_has_its_own_retry_policy():
+    policy = ExponentialBackoffRetry(0.01, 2.0, 2)
+    task = ExtTask(name="failing task", command=CommandHelper.get_failing_command(), retry_policy=policy)
+    result = await run_hedged(task, HedgePolicy(threshold_sec=0))
+    assert result.is_err()
+    # only the failures of the original attempt, as if it ran alone
+    assert policy.num_failures() == 2
+
+
+class SlowToCancelTask(Task):
+    """
+    The first attempt is a straggler which takes a while to clean up when cancelled, and fails doing so.
+    """
+
+    def __init__(self, name: str, attempts: list):
+        self.name = name
+        self.attempts = attempts
+
+    async def run(self) -> Result:
+        self.attempts.append(self.name)
+        if len(self.attempts) > 1:
+            return Result.ok('hedge')
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            await asyncio.sleep(0.5)
+            raise RuntimeError('cleanup failed')
+        return Result.ok('original')
+
+
+@pytest.mark.asyncio
+async def test_winner_does_not_wait_for_loser(caplog):
+    start = time.perf_counter()
+    result = await run_hedged(SlowToCancelTask('slow cleanup', []), HedgePolicy(threshold_sec=0.1))
+    assert result.value == 'hedge'
+    assert time.perf_counter() - start < 0.4
+    assert len(hedge._CANCELLING) == 1
+    await asyncio.gather(*hedge._CANCELLING)
+    assert 'cleanup failed' in caplog.text
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(sys.platform == 'win32', reason='requires POSIX text utilities')
+async def test_streamed_pipeline_is_not_hedged():
+    async def source():
+        await asyncio.sleep(0.2)
+        yield b'abc'
+
+    policy = HedgePolicy(threshold_sec=0)
+    pipeline = ExtPipeline('stream', stages=[ExtTask('count', ['wc', '-c'])], stdin=source())
+    result = await run_hedged(pipeline, policy)
+    assert int(result.value.output.stdout.strip()) == 3
+    assert policy.launched == 0
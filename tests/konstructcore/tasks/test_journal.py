@@ -0,0 +1,161 @@
+"""
+test the durable execution journal
+"""
+import asyncio
+import json
+import os
+
+import pytest
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.ext_task import ExtTask, ExtTaskOutput
+from konstructcore.tasks.journal import TaskJournal
+from konstructcore.tasks.limits import ResourceLimits
+from konstructcore.tasks.pipeline import ExtPipeline
+from konstructcore.tasks.runners import run_all
+from konstructcore.tasks.task import Task, TaskFailure
+from tests.konstructcore.tasks.helpers import CommandHelper
+
+
+class CountingTask(ExtTask):
+    """
+    count how many times the task actually runs
+    """
+    runs = 0
+
+    async def run(self):
+        CountingTask.runs += 1
+        return await super().run()
+
+
+@pytest.mark.asyncio
+async def test_resume_skips_completed_tasks(tmp_path):
+    path = str(tmp_path / 'batch.journal')
+    tasks = [CountingTask(name=f'echo {i}', command=CommandHelper.get_echo_command() + [str(i)]) for i in range(4)]
+    tasks.append(CountingTask(name='fail', command=CommandHelper.get_failing_command()))
+
+    async with TaskJournal(path, sync_every=2) as journal:
+        results = await run_all(tasks, journal=journal)
+    assert CountingTask.runs == 5
+    assert [r.is_ok() for r in results] == [True, True, True, True, False]
+    with open(path) as fp:
+        assert len(fp.readlines()) == 5
+
+    # simulate a crash in the middle of a write
+    with open(path, 'a') as fp:
+        fp.write('{"id": "trunc')
+
+    CountingTask.runs = 0
+    async with TaskJournal(path) as journal:
+        assert journal.num_completed() == 4
+        resumed = await run_all(tasks, journal=journal)
+    # only the failed task runs again
+    assert CountingTask.runs == 1
+    assert isinstance(resumed[2].value, ExtTaskOutput)
+    assert resumed[2].value.stdout == results[2].value.stdout
+    assert resumed[4].is_err()
+
+
+@pytest.mark.asyncio
+async def test_failure_is_recorded(tmp_path):
+    path = str(tmp_path / 'batch.journal')
+    task = ExtTask(name='fail', command=CommandHelper.get_failing_command())
+    async with TaskJournal(path) as journal:
+        await run_all([task], journal=journal)
+    with open(path) as fp:
+        record = json.loads(fp.readline())
+    assert record['id'] == task.identity()
+    assert record['result']['ok'] is False
+    assert record['result']['error']['type'] == TaskFailure.Fail_With_Stderr
+    assert record['result']['error']['return_code'] != 0
+
+
+def test_identity_ignores_name_and_timeout():
+    a = ExtTask(name='a', command=['tool', 'x'], cwd='/tmp', env={'A': '1'}, timeout=1)
+    b = ExtTask(name='b', command=['tool', 'x'], cwd='/tmp', env={'A': '1'}, timeout=2)
+    c = ExtTask(name='a', command=['tool', 'y'], cwd='/tmp', env={'A': '1'}, timeout=1)
+    assert a.identity() == b.identity()
+    assert a.identity() != c.identity()
+
+
+def test_identity_covers_output_and_limits():
+    task = ExtTask(name='a', command=['tool', 'x'])
+    quiet = ExtTask(name='a', command=['tool', 'x'], collect_output=False)
+    limited = ExtTask(name='a', command=['tool', 'x'], resource_limits=ResourceLimits(cpu_sec=10))
+    assert len({task.identity(), quiet.identity(), limited.identity()}) == 3
+
+    pipeline = ExtPipeline('p', [task], stdin='in.txt')
+    assert pipeline.identity() != ExtPipeline('p', [task], stdin='in.txt', collect_output=False).identity()
+    assert pipeline.identity() != ExtPipeline('p', [limited], stdin='in.txt').identity()
+
+    async def stream():
+        yield b'x'
+
+    assert ExtPipeline('p', [task], stdin=stream()).identity() is None
+
+
+@pytest.mark.asyncio
+async def test_append_after_truncated_line(tmp_path):
+    path = str(tmp_path / 'batch.journal')
+    with open(path, 'w') as fp:
+        fp.write('{"id": "trunc')
+    task = ExtTask(name='echo', command=CommandHelper.get_echo_command())
+    async with TaskJournal(path) as journal:
+        await run_all([task], journal=journal)
+    async with TaskJournal(path) as journal:
+        assert journal.lookup(task) is not None
+
+
+@pytest.mark.asyncio
+async def test_idle_journal_is_synced_periodically(tmp_path):
+    path = str(tmp_path / 'batch.journal')
+    task = ExtTask(name='echo', command=CommandHelper.get_echo_command())
+    async with TaskJournal(path, sync_every=100, sync_interval=0.1) as journal:
+        await journal.record(task, await task.run())
+        await asyncio.sleep(0.3)
+        with open(path) as fp:
+            assert json.loads(fp.readline())['id'] == task.identity()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_syncs_cover_later_records(tmp_path):
+    path = str(tmp_path / 'batch.journal')
+    tasks = [ExtTask(name=f'echo {i}', command=CommandHelper.get_echo_command() + [str(i)]) for i in range(2)]
+    results = [await task.run() for task in tasks]
+    async with TaskJournal(path, sync_every=100, sync_interval=100) as journal:
+        await journal.record(tasks[0], results[0])
+        first = asyncio.ensure_future(journal.sync())
+        await asyncio.sleep(0)
+        # written after the flush of the first sync, while its fsync is in progress
+        await journal.record(tasks[1], results[1])
+        await asyncio.gather(first, journal.sync())
+        with open(path) as fp:
+            assert len(fp.readlines()) == 2
+
+
+class Counter(Task):
+    """
+    a task without a stable identity
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.runs = 0
+
+    async def run(self) -> Result:
+        self.runs += 1
+        return Result.ok(self.runs)
+
+
+@pytest.mark.asyncio
+async def test_task_without_identity_is_not_journaled(tmp_path):
+    path = str(tmp_path / 'batch.journal')
+    first, second = Counter('count'), Counter('count')
+    async with TaskJournal(path) as journal:
+        await run_all([first], journal=journal)
+    async with TaskJournal(path) as journal:
+        assert journal.num_completed() == 0
+        assert journal.lookup(second) is None
+        await run_all([second], journal=journal)
+    assert second.runs == 1
+    assert os.path.getsize(path) == 0
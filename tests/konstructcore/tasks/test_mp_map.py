@@ -0,0 +1,78 @@
+"""
+test the batched process map
+"""
+import pytest
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks import mp_map
+from konstructcore.tasks.mp_map import process_map, process_map_stream
+
+
+def square(n: int) -> Result:
+    if n < 0:
+        raise ValueError(f'negative: {n}')
+    return Result.ok(n * n)
+
+
+def describe(payload) -> tuple[str, int, int]:
+    return type(payload).__name__, len(payload), payload[-1]
+
+
+@pytest.mark.asyncio
+async def test_ordered_map():
+    results = await process_map(square, list(range(500)), max_workers=2)
+    assert [r.value for r in results] == [n * n for n in range(500)]
+
+
+@pytest.mark.asyncio
+async def test_exceptions_become_errors():
+    results = await process_map(square, [1, -2, 3], chunk_size=2, max_workers=2)
+    assert results[0].value == 1
+    assert results[1].is_err()
+    assert isinstance(results[1].error, ValueError)
+    assert results[2].value == 9
+
+
+@pytest.mark.asyncio
+async def test_stream_map():
+    seen = {}
+    async for index, result in process_map_stream(square, list(range(100)), chunk_size=7, max_workers=2):
+        seen[index] = result.value
+    assert seen == {n: n * n for n in range(100)}
+
+
+@pytest.mark.asyncio
+async def test_large_payloads_go_through_shared_memory():
+    payloads = [bytes([i]) * (128 * 1024) for i in range(8)] + [b'small']
+    results = await process_map(describe, payloads, chunk_size=3, max_workers=2)
+    assert all(r.is_ok() for r in results)
+    for i in range(8):
+        assert results[i].value == ('memoryview', 128 * 1024, i)
+    assert results[-1].value == ('bytes', 5, ord('l'))
+
+
+@pytest.mark.asyncio
+async def test_shared_memory_is_bounded_to_chunks_in_flight(monkeypatch):
+    live = set()
+    peak = 0
+    pack, release = mp_map._pack, mp_map._release
+
+    def tracked_pack(items, threshold):
+        nonlocal peak
+        packed, shm = pack(items, threshold)
+        if shm is not None:
+            live.add(shm.name)
+            peak = max(peak, len(live))
+        return packed, shm
+
+    def tracked_release(shm):
+        live.discard(shm.name)
+        release(shm)
+
+    monkeypatch.setattr(mp_map, '_pack', tracked_pack)
+    monkeypatch.setattr(mp_map, '_release', tracked_release)
+    payloads = [bytes([i]) * (128 * 1024) for i in range(40)]
+    results = await process_map(describe, payloads, chunk_size=1, max_workers=2)
+    assert [r.value[2] for r in results] == list(range(40))
+    assert peak <= 2 * 2
+    assert not live
@@ -0,0 +1,94 @@
+"""
+test external pipelines
+"""
+import sys
+
+import pytest
+
+from konstructcore.tasks.ext_task import ExtTask
+from konstructcore.tasks.pipeline import ExtPipeline, ExtPipelineFailure
+from konstructcore.tasks.task import TaskFailure
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='requires POSIX text utilities')
+
+
+@pytest.mark.asyncio
+async def test_three_stages():
+    pipeline = ExtPipeline('upper', stages=[
+        ExtTask('echo', ['echo', 'hello']),
+        ExtTask('upper', ['tr', 'a-z', 'A-Z']),
+        ExtTask('cat', ['cat']),
+    ])
+    result = await pipeline.run()
+    assert result.is_ok()
+    assert result.value.output.stdout == 'HELLO\n'
+    assert len(result.value.stages) == 3
+    assert all(r.is_ok() for r in result.value.stages)
+    assert pipeline.command_string() == '```echo hello | tr a-z A-Z | cat```'
+
+
+@pytest.mark.asyncio
+async def test_file_to_file(tmp_path):
+    src = tmp_path / 'in.txt'
+    dst = tmp_path / 'out.txt'
+    src.write_text('abc\n' * 1000)
+    pipeline = ExtPipeline('files',
+                           stages=[ExtTask('upper', ['tr', 'a-z', 'A-Z']), ExtTask('cat', ['cat'])],
+                           stdin=str(src),
+                           stdout=str(dst))
+    result = await pipeline.run()
+    assert result.is_ok()
+    assert dst.read_text() == 'ABC\n' * 1000
+
+
+@pytest.mark.asyncio
+async def test_async_stream_input():
+    chunk = b'x' * 65536
+
+    async def source():
+        for _ in range(64):
+            yield chunk
+
+    pipeline = ExtPipeline('stream', stages=[ExtTask('cat', ['cat']), ExtTask('count', ['wc', '-c'])],
+                           stdin=source())
+    result = await pipeline.run()
+    assert result.is_ok()
+    assert int(result.value.output.stdout.strip()) == 64 * 65536
+
+
+@pytest.mark.asyncio
+async def test_failing_stream_input():
+    async def source():
+        yield b'abc\n'
+        raise OSError('source is gone')
+
+    pipeline = ExtPipeline('stream', stages=[ExtTask('cat', ['cat']), ExtTask('count', ['wc', '-c'])],
+                           stdin=source())
+    result = await pipeline.run()
+    assert result.is_err()
+    assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Exception
+    assert 'source is gone' in str(result.error)
+
+
+@pytest.mark.asyncio
+async def test_failing_stage():
+    pipeline = ExtPipeline('broken', stages=[
+        ExtTask('echo', ['echo', 'hello']),
+        ExtTask('fail', ['sh', '-c', 'cat > /dev/null; echo boom >&2; exit 3']),
+        ExtTask('cat', ['cat']),
+    ])
+    result = await pipeline.run()
+    assert result.is_err()
+    assert isinstance(result.error, ExtPipelineFailure)
+    assert result.error.return_code == 3
+    assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_With_Stderr
+    assert [r.is_ok() for r in result.error.stages] == [True, False, True]
+    assert 'boom' in str(result.error)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_timeout():
+    pipeline = ExtPipeline('slow', stages=[ExtTask('sleep', ['sleep', '5']), ExtTask('cat', ['cat'])], timeout=0.3)
+    result = await pipeline.run()
+    assert result.is_err()
+    assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Time_Out
@@ -0,0 +1,82 @@
+"""
+test the token-bucket rate limiter
+"""
+import asyncio
+import time
+
+import pytest
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.ratelimit import TokenBucket, RateLimitedTask, rate_limiter
+from konstructcore.tasks.runners import run_all
+from konstructcore.tasks.thread_task import InlineTask
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket('test-pace', rate=20, burst=5)
+    start = time.perf_counter()
+    await asyncio.gather(*[bucket.acquire() for _ in range(15)])
+    elapsed = time.perf_counter() - start
+    # 5 tokens right away, then 10 more at 20 per second
+    assert 0.45 < elapsed < 0.8
+    stats = bucket.stats()
+    assert stats.acquired == 15
+    assert stats.waited == 10
+    assert stats.max_wait_sec > 0.4
+    assert bucket.try_acquire() is False
+
+
+@pytest.mark.asyncio
+async def test_shared_bucket_by_name():
+    with pytest.raises(KeyError):
+        rate_limiter('test-unknown')
+    bucket = rate_limiter('test-shared', rate=10, burst=2)
+    assert rate_limiter('test-shared') is bucket
+    assert rate_limiter('test-shared', rate=100, burst=2) is bucket
+    assert bucket.rate == 100
+
+    tasks = [InlineTask(f'noop {i}', lambda env: Result.ok(None)) for i in range(10)]
+    start = time.perf_counter()
+    results = await run_all(tasks, rate_limit='test-shared')
+    assert all(r.is_ok() for r in results)
+    assert 0.05 < time.perf_counter() - start < 0.5
+
+    task = RateLimitedTask(InlineTask('noop', lambda env: Result.ok(1)), 'test-shared')
+    assert (await task.run()).value == 1
+    assert bucket.stats().acquired == 11
+
+
+@pytest.mark.asyncio
+async def test_more_tokens_than_burst():
+    bucket = TokenBucket('test-burst', rate=100, burst=2)
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(bucket.acquire(3), timeout=1)
+    with pytest.raises(ValueError):
+        bucket.try_acquire(3)
+    await bucket.acquire(2)
+
+
+def test_bucket_shared_across_event_loops():
+    bucket = TokenBucket('test-loops', rate=100, burst=1)
+
+    async def contend():
+        await asyncio.gather(*[bucket.acquire() for _ in range(3)])
+
+    asyncio.run(contend())
+    asyncio.run(contend())
+    assert bucket.stats().acquired == 6
+
+
+@pytest.mark.asyncio
+async def test_lowered_burst_fails_waiting_acquire():
+    bucket = TokenBucket('test-shrink', rate=1, burst=3)
+    await bucket.acquire(3)
+    waiting = asyncio.ensure_future(bucket.acquire(3))
+    queued = asyncio.ensure_future(bucket.acquire(1))
+    await asyncio.sleep(0.05)
+    bucket.configure(rate=100, burst=2)
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(waiting, timeout=1)
+    # the next caller in line is served
+    await asyncio.wait_for(queued, timeout=1)
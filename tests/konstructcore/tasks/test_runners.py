@@ -1,10 +1,15 @@
 """
 test task runner
 """
+import time
+
 import pytest
 
+from konstructcore.datatypes.result import Result
 from konstructcore.tasks.ext_task import ExtTask
-from konstructcore.tasks.runners import run_all
+from konstructcore.tasks.runners import run_all, repeat
+from konstructcore.tasks.task import TaskFailure
+from konstructcore.tasks.thread_task import InlineTask
 from tests.konstructcore.tasks.helpers import CommandHelper
 
 
@@ -20,3 +25,55 @@ async def test_run_all_tasks_expect_concurrency():
     assert len(results) == num_tasks
     for result in results:
         assert result.is_ok()
+
+
+@pytest.mark.asyncio
+async def test_run_all_fail_fast():
+    tasks = [
+        ExtTask(name="slow task", command=CommandHelper.get_sleep_command(5)),
+        ExtTask(name="failing task", command=CommandHelper.get_failing_command()),
+        ExtTask(name="another slow task", command=CommandHelper.get_sleep_command(5)),
+    ]
+    start = time.perf_counter()
+    results = await run_all(tasks, fail_fast=True)
+    assert time.perf_counter() - start < 4
+    assert len(results) == 3
+    assert TaskFailure.unwrap_failure_type(results[0].error) == TaskFailure.Fail_Cancelled
+    assert results[1].is_err()
+    assert TaskFailure.unwrap_failure_type(results[1].error) != TaskFailure.Fail_Cancelled
+    assert TaskFailure.unwrap_failure_type(results[2].error) == TaskFailure.Fail_Cancelled
+
+
+@pytest.mark.asyncio
+async def test_repeat_returns_summary():
+    task = ExtTask(name="echo task", command=CommandHelper.get_echo_command())
+    result = await repeat(task, count=5)
+    assert result.is_ok()
+    assert result.value.successes == 5
+    assert result.value.failures == 0
+    assert result.value.latency.count == 5
+    assert result.value.achieved_rate() > 0
+
+
+@pytest.mark.asyncio
+async def test_repeat_stops_on_failure():
+    task = ExtTask(name="failing task", command=CommandHelper.get_failing_command())
+    result = await repeat(task, count=5)
+    assert result.is_err()
+
+    result = await repeat(task, count=3, stop_on_failure=False)
+    assert result.is_ok()
+    assert result.value.failures == 3
+
+
+@pytest.mark.asyncio
+async def test_repeat_at_fixed_rate():
+    task = InlineTask("noop", lambda env: Result.ok(None))
+    start = time.perf_counter()
+    result = await repeat(task, rate=50, duration=0.5, concurrency=2)
+    elapsed = time.perf_counter() - start
+    assert result.is_ok()
+    assert result.value.successes == 25
+    assert 0.45 < elapsed < 1.0
+    assert result.value.achieved_rate() == pytest.approx(50, rel=0.2)
+    assert result.value.latency.percentile(99) < 0.1
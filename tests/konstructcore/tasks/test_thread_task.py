@@ -0,0 +1,105 @@
+"""
+test in-process tasks and the executor selection
+"""
+import threading
+import time
+
+import pytest
+
+from konstructcore.datatypes.result import Result
+from konstructcore.tasks.executors import WorkloadHint, ExecutorKind, select_executor, create_task
+from konstructcore.tasks.mp_task import FutureProcessTask
+from konstructcore.tasks.retry import RetryWithConstantSleep
+from konstructcore.tasks.runners import run_all
+from konstructcore.tasks.task import TaskFailure
+from konstructcore.tasks.thread_task import FutureThreadTask, InlineTask
+
+
+class Sleeper:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def __call__(self, env_: dict) -> Result:
+        time.sleep(self.seconds)
+        return Result.ok(threading.current_thread().name)
+
+
+class Flaky:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, env_: dict) -> Result:
+        self.calls += 1
+        if self.calls < 3:
+            raise RuntimeError('not yet')
+        return Result.ok(env_['VALUE'])
+
+
+@pytest.mark.asyncio
+async def test_thread_tasks_run_concurrently():
+    tasks = [FutureThreadTask(f'sleep {i}', Sleeper(0.3)) for i in range(5)]
+    start = time.perf_counter()
+    results = await run_all(tasks)
+    assert time.perf_counter() - start < 1.0
+    assert all(r.is_ok() for r in results)
+    assert all(r.value != threading.current_thread().name for r in results)
+
+
+@pytest.mark.asyncio
+async def test_thread_task_timeout():
+    result = await FutureThreadTask('slow', Sleeper(1), timeout=0.1).run()
+    assert result.is_err()
+    assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Time_Out
+
+
+@pytest.mark.asyncio
+async def test_thread_task_retry():
+    task = FutureThreadTask('flaky', Flaky(), env={'VALUE': 'ok'},
+                            retry_policy=RetryWithConstantSleep(sleep_sec=0.01, retries=3))
+    result = await task.run()
+    assert result.is_ok()
+    assert result.value == 'ok'
+    assert task.retry_policy.num_failures() == 2
+
+
+@pytest.mark.asyncio
+async def test_inline_task():
+    result = await InlineTask('inline', Sleeper(0)).run()
+    assert result.value == threading.current_thread().name
+
+    result = await InlineTask('inline', Flaky(), env={'VALUE': 'ok'}).run()
+    assert TaskFailure.unwrap_failure_type(result.error) == TaskFailure.Fail_Exception
+
+
+def test_select_executor():
+    assert select_executor(WorkloadHint.Trivial) == ExecutorKind.Inline
+    assert select_executor(WorkloadHint.IO_Bound) == ExecutorKind.Thread
+    assert select_executor(WorkloadHint.GIL_Releasing) == ExecutorKind.Thread
+    assert select_executor(WorkloadHint.CPU_Bound) == ExecutorKind.Process
+    assert select_executor(WorkloadHint.CPU_Bound, expected_duration_sec=0.001) == ExecutorKind.Inline
+    with pytest.raises(ValueError):
+        select_executor('Unknown')
+    assert isinstance(create_task('t', Sleeper(0), WorkloadHint.IO_Bound), FutureThreadTask)
+    assert isinstance(create_task('t', Sleeper(0), WorkloadHint.CPU_Bound), FutureProcessTask)
+
+
+class Echo:
+    def __init__(self, value: str):
+        self.value = value
+
+    def __call__(self, env_: dict) -> Result:
+        return Result.ok(self.value)
+
+
+@pytest.mark.asyncio
+async def test_identity_depends_on_workload_state():
+    tasks = [FutureThreadTask('echo', Echo(value)) for value in 'xyz']
+    assert len({task.identity() for task in tasks}) == 3
+    assert InlineTask('echo', Echo('x')).identity() == InlineTask('other', Echo('x')).identity()
+    results = await run_all(tasks, dedup=True)
+    assert [r.value for r in results] == ['x', 'y', 'z']
+
+    # an unpicklable workload never shares an identity
+    lock = threading.Lock()
+    first, second = (FutureThreadTask('lock', lambda env_: lock) for _ in range(2))
+    assert first.identity() != second.identity()